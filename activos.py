@@ -0,0 +1,139 @@
+## Archivos estáticos con huella: nombres con hash, copias comprimidas y cache de un año
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory
+
+# Los archivos procesados van a static/dist; el manifiesto mapea nombre original -> nombre con hash
+SUBDIRECTORIO_DIST = 'dist'
+MANIFIESTO = 'manifest.json'
+COMPRIMIBLES = {'.css', '.js', '.svg', '.json', '.txt'}
+# Ancho en px con el que se publica cada imagen: el doble de lo que ocupa en pantalla (.logo mide 200px)
+ANCHOS_IMAGENES = {'img/logo.png': 400}
+# Extensiones que no se publican (archivos sin usar como registro_equipo.js_)
+IGNORAR = {'.js_'}
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def huella(contenido):
+    return hashlib.sha256(contenido).hexdigest()[:10]
+
+
+def _redimensionar(ruta, ancho):
+    from PIL import Image
+    with Image.open(ruta) as imagen:
+        if imagen.width <= ancho:
+            with open(ruta, 'rb') as f:
+                return f.read()
+        alto = round(imagen.height * ancho / imagen.width)
+        salida = io.BytesIO()
+        imagen.resize((ancho, alto), Image.LANCZOS).save(salida, format=imagen.format, optimize=True)
+        return salida.getvalue()
+
+
+def _comprimir(ruta, contenido):
+    """Escribe las copias .gz y, si está instalado el paquete brotli, .br."""
+    with open(ruta + '.gz', 'wb') as f:
+        f.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(ruta + '.br', 'wb') as f:
+        f.write(brotli.compress(contenido, quality=11))
+
+
+def construir_activos(directorio_estatico):
+    """Copia cada archivo de `static` a `static/dist` con su huella en el nombre.
+
+    Regresa el manifiesto, que también se guarda en static/dist/manifest.json.
+    """
+    dist = os.path.join(directorio_estatico, SUBDIRECTORIO_DIST)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    manifiesto = {}
+    for raiz, directorios, archivos in os.walk(directorio_estatico):
+        directorios[:] = sorted(d for d in directorios if os.path.join(raiz, d) != dist)
+        for nombre in sorted(archivos):
+            base, extension = os.path.splitext(nombre)
+            if extension in IGNORAR:
+                continue
+            ruta = os.path.join(raiz, nombre)
+            relativa = os.path.relpath(ruta, directorio_estatico).replace(os.sep, '/')
+            ancho = ANCHOS_IMAGENES.get(relativa)
+            if ancho:
+                contenido = _redimensionar(ruta, ancho)
+                base = f'{base}.{ancho}w'
+            else:
+                with open(ruta, 'rb') as f:
+                    contenido = f.read()
+
+            destino_relativo = '/'.join(filter(None, [
+                SUBDIRECTORIO_DIST, os.path.dirname(relativa), f'{base}.{huella(contenido)}{extension}']))
+            destino = os.path.join(directorio_estatico, destino_relativo)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            with open(destino, 'wb') as f:
+                f.write(contenido)
+            if extension in COMPRIMIBLES:
+                _comprimir(destino, contenido)
+            manifiesto[relativa] = destino_relativo
+
+    with open(os.path.join(dist, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    return manifiesto
+
+
+class Activos:
+    """Reescribe url_for('static', ...) a los nombres con huella y los sirve con cache inmutable.
+
+    Sin manifiesto (antes de correr `flask construir-activos`) todo se sirve
+    como siempre desde static/.
+    """
+
+    def __init__(self, app=None):
+        self.manifiesto = {}
+        self.publicados = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directorio = app.static_folder
+        self.recargar()
+        app.url_defaults(self._reescribir_url)
+        app.view_functions['static'] = self.servir
+
+    def recargar(self):
+        try:
+            with open(os.path.join(self.directorio, SUBDIRECTORIO_DIST, MANIFIESTO), encoding='utf-8') as f:
+                self.manifiesto = json.load(f)
+        except (OSError, ValueError):
+            self.manifiesto = {}
+        self.publicados = set(self.manifiesto.values())
+
+    def _reescribir_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifiesto:
+            values['filename'] = self.manifiesto[values['filename']]
+
+    def servir(self, filename):
+        if filename not in self.publicados:
+            return send_from_directory(self.directorio, filename)
+
+        mimetype = mimetypes.guess_type(filename)[0]
+        for codificacion, extension in CODIFICACIONES:
+            if request.accept_encodings[codificacion] and os.path.exists(
+                    os.path.join(self.directorio, filename + extension)):
+                respuesta = send_from_directory(self.directorio, filename + extension, mimetype=mimetype)
+                respuesta.headers['Content-Encoding'] = codificacion
+                break
+        else:
+            respuesta = send_from_directory(self.directorio, filename, mimetype=mimetype)
+        # El nombre cambia con el contenido, así que el navegador nunca tiene que revalidar
+        respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
@@ -0,0 +1,148 @@
+## Resúmenes precalculados que se mantienen de forma incremental
+from datetime import date
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import Alumno, Pago, Pedido, ResumenPedidos, SaldoAlumno, Session
+
+LLAVE_RESUMEN = ['fecha', 'tipo_producto', 'talla', 'color']
+
+
+def acumular_pedidos(session, filas, signo=1):
+    """Suma (signo=1) o resta (signo=-1) líneas de pedido al resumen diario.
+
+    `filas` son dicts con las columnas de Pedido, como las que recibe
+    insertar_pedidos.
+    """
+    totales = {}
+    for fila in filas:
+        llave = (fila['fecha'], fila['tipo_producto'], fila['talla'], fila['color'] or '')
+        cantidad, lineas = totales.get(llave, (0, 0))
+        totales[llave] = (cantidad + signo * fila['cantidad'], lineas + signo)
+    if not totales:
+        return
+
+    stmt = sqlite_insert(ResumenPedidos).values([
+        dict(zip(LLAVE_RESUMEN, llave), cantidad=cantidad, lineas=lineas)
+        for llave, (cantidad, lineas) in totales.items()
+    ])
+    stmt = stmt.on_conflict_do_update(index_elements=LLAVE_RESUMEN, set_={
+        'cantidad': ResumenPedidos.cantidad + stmt.excluded.cantidad,
+        'lineas': ResumenPedidos.lineas + stmt.excluded.lineas,
+    })
+    session.execute(stmt)
+    if signo < 0:
+        session.execute(delete(ResumenPedidos).where(ResumenPedidos.lineas <= 0))
+
+
+def reconstruir_resumen_pedidos(session):
+    session.execute(delete(ResumenPedidos))
+    color = func.coalesce(Pedido.color, '')
+    session.execute(insert(ResumenPedidos).from_select(
+        LLAVE_RESUMEN + ['cantidad', 'lineas'],
+        select(Pedido.fecha, Pedido.tipo_producto, Pedido.talla, color,
+               func.sum(Pedido.cantidad), func.count())
+        .group_by(Pedido.fecha, Pedido.tipo_producto, Pedido.talla, color)
+    ))
+
+
+def totales_pedidos(session, desde, hasta):
+    """Cantidad total por producto, talla y color entre dos fechas (inclusive)."""
+    cantidad = func.sum(ResumenPedidos.cantidad)
+    return (session.query(ResumenPedidos.tipo_producto, ResumenPedidos.talla, ResumenPedidos.color, cantidad)
+            .filter(ResumenPedidos.fecha.between(desde, hasta))
+            .group_by(ResumenPedidos.tipo_producto, ResumenPedidos.talla, ResumenPedidos.color)
+            .order_by(ResumenPedidos.tipo_producto, ResumenPedidos.talla, ResumenPedidos.color)
+            .all())
+
+
+def acumular_pago(session, alumno_id, fecha, monto):
+    """Agrega un pago al saldo del alumno. Debe llamarse antes de agregar el Pago a la sesión."""
+    inicio_mes = fecha.replace(day=1)
+    fin_mes = date(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1)
+    mes_nuevo = session.query(Pago.id).filter(
+        Pago.alumno_id == alumno_id, Pago.fecha >= inicio_mes, Pago.fecha < fin_mes).first() is None
+
+    stmt = sqlite_insert(SaldoAlumno).values(
+        alumno_id=alumno_id, total_pagado=monto, num_pagos=1, ultimo_pago=fecha, meses_cubiertos=int(mes_nuevo))
+    stmt = stmt.on_conflict_do_update(index_elements=['alumno_id'], set_={
+        'total_pagado': SaldoAlumno.total_pagado + stmt.excluded.total_pagado,
+        'num_pagos': SaldoAlumno.num_pagos + 1,
+        'ultimo_pago': func.max(func.coalesce(SaldoAlumno.ultimo_pago, stmt.excluded.ultimo_pago),
+                                stmt.excluded.ultimo_pago),
+        'meses_cubiertos': SaldoAlumno.meses_cubiertos + stmt.excluded.meses_cubiertos,
+    })
+    session.execute(stmt)
+
+
+def reconstruir_saldos(session):
+    session.execute(delete(SaldoAlumno))
+    session.execute(insert(SaldoAlumno).from_select(
+        ['alumno_id', 'total_pagado', 'num_pagos', 'ultimo_pago', 'meses_cubiertos'],
+        select(Pago.alumno_id, func.sum(Pago.monto), func.count(), func.max(Pago.fecha),
+               func.count(func.distinct(func.strftime('%Y-%m', Pago.fecha))))
+        .where(Pago.alumno_id.isnot(None))
+        .group_by(Pago.alumno_id)
+    ))
+
+
+def consulta_estado_pagos(session, columnas, desde=None, hasta=None):
+    """`columnas` de Alumno más total_pagado, num_pagos, ultimo_pago y meses_cubiertos.
+
+    Sin rango salen de la tabla de saldos. Con rango son subconsultas
+    correlacionadas sobre ix_pagos_alumno_fecha, que SQLite sólo evalúa para
+    las filas que regresa: una página de alumnos no agrupa todos los pagos del
+    rango.
+    """
+    if desde is None and hasta is None:
+        return (session.query(*columnas,
+                              func.coalesce(SaldoAlumno.total_pagado, 0).label('total_pagado'),
+                              func.coalesce(SaldoAlumno.num_pagos, 0).label('num_pagos'),
+                              SaldoAlumno.ultimo_pago,
+                              func.coalesce(SaldoAlumno.meses_cubiertos, 0).label('meses_cubiertos'))
+                .select_from(Alumno)
+                .outerjoin(SaldoAlumno, SaldoAlumno.alumno_id == Alumno.id))
+
+    filtros = [Pago.alumno_id == Alumno.id]
+    if desde is not None:
+        filtros.append(Pago.fecha >= desde)
+    if hasta is not None:
+        filtros.append(Pago.fecha <= hasta)
+
+    def por_alumno(expresion, nombre):
+        return select(expresion).where(*filtros).correlate(Alumno).scalar_subquery().label(nombre)
+
+    return (session.query(*columnas,
+                          por_alumno(func.coalesce(func.sum(Pago.monto), 0), 'total_pagado'),
+                          por_alumno(func.count(), 'num_pagos'),
+                          por_alumno(func.max(Pago.fecha), 'ultimo_pago'),
+                          por_alumno(func.count(func.distinct(func.strftime('%Y-%m', Pago.fecha))), 'meses_cubiertos'))
+            .select_from(Alumno))
+
+
+def consulta_morosos(session, corte, *columnas):
+    """Alumnos activos sin pagos desde `corte`, en una sola consulta sobre el resumen."""
+    return (session.query(*columnas)
+            .select_from(Alumno)
+            .outerjoin(SaldoAlumno, SaldoAlumno.alumno_id == Alumno.id)
+            .filter(Alumno.estatus == 'activo')
+            .filter(or_(SaldoAlumno.ultimo_pago.is_(None), SaldoAlumno.ultimo_pago < corte))
+            .order_by(SaldoAlumno.ultimo_pago, Alumno.apaterno, Alumno.apmaterno, Alumno.nombre))
+
+
+def morosos(session, corte):
+    return consulta_morosos(session, corte, Alumno, SaldoAlumno).all()
+
+
+def inicializar_agregados():
+    # Bases existentes: los resúmenes se llenan una vez a partir de las tablas
+    session = Session()
+    try:
+        if session.query(ResumenPedidos).first() is None and session.query(Pedido).first() is not None:
+            reconstruir_resumen_pedidos(session)
+        if session.query(SaldoAlumno).first() is None and session.query(Pago).first() is not None:
+            reconstruir_saldos(session)
+        session.commit()
+    finally:
+        session.close()
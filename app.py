@@ -1,64 +1,269 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from sqlalchemy import create_engine, Column, Integer, String, Date, ForeignKey, Float, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context, url_for
+import click
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import joinedload
 from datetime import date, datetime
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image as PDFImage
+import base64
+import csv
+import io
+import json
 from io import BytesIO
+from urllib.parse import quote
+import unicodedata
+from reportes import MIME_PDF, MIME_XLSX, PRECARGAR_REPORTES, buffer_reporte, escribir_excel, escribir_pdf, precargar
+from cache_reportes import cache, clave_reporte
+from trabajos import LISTO, ColaLlena, cola
+from database import (ALUMNO_ACTUALIZADO, ALUMNO_CREADO, ALUMNO_ELIMINADO, PAGO_REGISTRADO, PEDIDO_CREADO,
+                      PEDIDO_ELIMINADO, Alumno, CambioPedido, ContadorCambios, Pago, Pedido, SaldoAlumno, Session,
+                      db_session, engine, registrar_eventos,
+                      init_db, marcar_cambio, registrar_cambios_pedidos)
+from importacion import ENCABEZADOS as ENCABEZADOS_IMPORTACION, exportar_csv, filas_exportacion, importar_alumnos, leer_archivo
+from busqueda import MAX_RESULTADOS, buscar_alumnos
+from agregados import (acumular_pago, acumular_pedidos, consulta_estado_pagos, consulta_morosos, inicializar_agregados, morosos,
+                       totales_pedidos)
+from metricas import metricas
+from eventos import (cambios_alumno, compactar, datos_alumno, datos_pedido, diferencias_resumenes, iniciar_registro,
+                     pedidos_de_fecha, reconstruir_resumenes)
+from activos import Activos, construir_activos
+from archivo_reportes import ARCHIVO_AUTOMATICO, FORMATOS as FORMATOS_ARCHIVO, ProgramadorArchivo, archivo
 
 app = Flask(__name__)
-
-# Database setup
-engine = create_engine('sqlite:///AlumnosTB.db', echo=True)
-Base = declarative_base()
-Session = sessionmaker(bind=engine)
-
-class Alumno(Base):
-    __tablename__ = 'alumnos'
-    id = Column(Integer, primary_key=True)
-    apaterno = Column(String(50), nullable=False)
-    apmaterno = Column(String(50), nullable=False)
-    nombre = Column(String(50), nullable=False)
-    fbday = Column(Date, nullable=False)
-    curp = Column(String(18), unique=True, nullable=False)
-    calle = Column(String(100), nullable=True)
-    numero = Column(String(10), nullable=False)
-    colonia = Column(String(100), nullable=False)
-    email = Column(String(100), nullable=False)
-    telefono = Column(String(15), nullable=False)
-    numafiliacion = Column(String(20), unique=True, nullable=True)
-    estatus = Column(String(10), nullable=False)
-    pagos = relationship("Pago", back_populates="alumno")
-
-class Pago(Base):
-    __tablename__ = 'pagos'
-    id = Column(Integer, primary_key=True)
-    alumno_id = Column(Integer, ForeignKey('alumnos.id'))
-    fecha = Column(Date, nullable=False)
-    monto = Column(Float, nullable=False)
-    concepto = Column(String(100), nullable=False)
-    alumno = relationship("Alumno", back_populates="pagos")
-
-class Pedido(Base):
-    __tablename__ = 'pedidos'
-    id = Column(Integer, primary_key=True)
-    fecha = Column(Date, nullable=False)
-    nombre_solicitante = Column(String(100), nullable=False)
-    tipo_producto = Column(String(50), nullable=False)
-    talla = Column(String(10), nullable=False)
-    color = Column(String(50))
-    cantidad = Column(Integer, nullable=False)
-
-Base.metadata.create_all(engine)
+activos = Activos(app)
+
+init_db()
+inicializar_agregados()
+iniciar_registro()
+metricas.instrumentar_engine(engine)
+if PRECARGAR_REPORTES:
+    precargar()
+
+@app.teardown_appcontext
+def cerrar_sesion(exception=None):
+    db_session.remove()
+
+## Métricas
+@app.before_request
+def iniciar_metricas():
+    metricas.iniciar_peticion()
+
+@app.after_request
+def registrar_metricas(response):
+    # En las descargas por partes se mide hasta que la respuesta está lista, sin el envío
+    metricas.terminar_peticion(request.endpoint, request.method, response.status_code)
+    return response
+
+@app.route('/metrics')
+def exponer_metricas():
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
+# Columnas de los reportes en Excel
+ENCABEZADOS_ALUMNOS = ['No', 'Apellido Paterno', 'Apellido Materno', 'Nombre', 'Fecha de Nacimiento', 'CURP',
+                       'Calle', 'Número', 'Colonia', 'Email', 'Teléfono', 'Número de Afiliación']
+ENCABEZADOS_ALUMNOS_PDF = ['No', 'Nombre', 'Fecha de Nacimiento', 'CURP', 'Teléfono', 'Email', 'No. Afiliación']
+ENCABEZADOS_PAGOS = ['Fecha Pago', 'Monto', 'Concepto']
+ENCABEZADOS_PEDIDOS = ['Fecha', 'Solicitante', 'Producto', 'Talla', 'Color', 'Cantidad']
+LOGO_PEDIDOS = {'ruta': 'static/img/logo.png', 'ancho': 480, 'alto': 100, 'celda': 'B1', 'merge': 'A1:F5'}
+
+# Columnas que lee cada reporte, en el orden de sus encabezados; las filas van
+# tal cual de la consulta al escritor, sin crear objetos del modelo
+COLUMNAS_ALUMNOS = (Alumno.id, Alumno.apaterno, Alumno.apmaterno, Alumno.nombre, Alumno.fbday, Alumno.curp,
+                    Alumno.calle, Alumno.numero, Alumno.colonia, Alumno.email, Alumno.telefono,
+                    Alumno.numafiliacion)
+COLUMNAS_ALUMNOS_PDF = (Alumno.id, Alumno.apaterno + ' ' + Alumno.apmaterno + ' ' + Alumno.nombre, Alumno.fbday,
+                        Alumno.curp, Alumno.telefono, Alumno.email, Alumno.numafiliacion)
+COLUMNAS_PAGOS = (Pago.fecha, Pago.monto, Pago.concepto)
+COLUMNAS_REPORTE_PEDIDOS = (Pedido.fecha, Pedido.nombre_solicitante, Pedido.tipo_producto, Pedido.talla,
+                            func.coalesce(func.nullif(Pedido.color, ''), 'N/A'), Pedido.cantidad)
+
+# Tamaño de cada bloque al enviar un reporte (transferencia por partes)
+TAMANO_BLOQUE = 64 * 1024
+
+def enviar_reporte(buffer, filename, mimetype):
+    buffer.seek(0)
+
+    def bloques():
+        try:
+            while True:
+                bloque = buffer.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                yield bloque
+        finally:
+            buffer.close()
+
+    return Response(bloques(), mimetype=mimetype, headers={'Content-Disposition': disposicion(filename)})
+
+def disposicion(filename):
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+def leer_buffer(buffer):
+    buffer.seek(0)
+    contenido = buffer.read()
+    buffer.close()
+    return contenido
+
+def versiones_tablas(session, tablas):
+    return dict(session.query(ContadorCambios.tabla, ContadorCambios.version)
+                .filter(ContadorCambios.tabla.in_(tablas)))
+
+def servir_reporte(session, tipo, parametros, tablas, filename, mimetype, construir):
+    clave = clave_reporte(tipo, parametros, versiones_tablas(session, tablas))
+    etag = f'"{clave}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={'ETag': etag})
+
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        buffer = buffer_reporte()
+        with metricas.medir_reporte(tipo):
+            cola.ejecutar(metricas.en_peticion(construir), buffer)
+        if buffer.tell() > cache.max_bytes_reporte:
+            respuesta = enviar_reporte(buffer, filename, mimetype)
+            respuesta.headers['ETag'] = etag
+            return respuesta
+        entrada = (leer_buffer(buffer), filename, mimetype)
+        cache.guardar(clave, *entrada)
+
+    contenido, filename, mimetype = entrada
+    respuesta = enviar_reporte(BytesIO(contenido), filename, mimetype)
+    respuesta.headers['ETag'] = etag
+    return respuesta
+
+## Paginación por llave (keyset) para los listados
+TAMANO_PAGINA = 50
+MAX_TAMANO_PAGINA = 200
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+
+def limite_pagina():
+    return max(1, min(request.args.get('limite', TAMANO_PAGINA, type=int), MAX_TAMANO_PAGINA))
+
+def pagina_pedidos(session, cursor=None, limite=TAMANO_PAGINA):
+    query = session.query(Pedido).order_by(Pedido.fecha.desc(), Pedido.id.desc())
+    if cursor:
+        fecha, pedido_id = decodificar_cursor(cursor)
+        query = query.filter(tuple_(Pedido.fecha, Pedido.id) < (date.fromisoformat(fecha), pedido_id))
+    pedidos = query.limit(limite + 1).all()
+    siguiente = None
+    if len(pedidos) > limite:
+        pedidos = pedidos[:limite]
+        siguiente = codificar_cursor([pedidos[-1].fecha.isoformat(), pedidos[-1].id])
+    return pedidos, siguiente
+
+def pagina_alumnos(session, cursor=None, limite=TAMANO_PAGINA, query=None):
+    # `query` puede traer columnas en lugar de Alumno mientras incluya las del orden
+    columnas = (Alumno.apaterno, Alumno.apmaterno, Alumno.nombre, Alumno.id)
+    query = (session.query(Alumno) if query is None else query).order_by(*columnas)
+    if cursor:
+        query = query.filter(tuple_(*columnas) > tuple(decodificar_cursor(cursor)))
+    alumnos = query.limit(limite + 1).all()
+    siguiente = None
+    if len(alumnos) > limite:
+        alumnos = alumnos[:limite]
+        a = alumnos[-1]
+        siguiente = codificar_cursor([a.apaterno, a.apmaterno, a.nombre, a.id])
+    return alumnos, siguiente
+
+# Columnas que se serializan; las consultas por columnas evitan crear objetos Pedido
+COLUMNAS_PEDIDO = (Pedido.id, Pedido.fecha, Pedido.nombre_solicitante, Pedido.tipo_producto, Pedido.talla,
+                   Pedido.color, Pedido.cantidad)
+
+def pedido_a_dict(pedido):
+    return {
+        "id": pedido.id,
+        "fecha": pedido.fecha.strftime('%Y-%m-%d'),
+        "nombre_solicitante": pedido.nombre_solicitante,
+        "tipo_producto": pedido.tipo_producto,
+        "talla": pedido.talla,
+        "color": pedido.color,
+        "cantidad": pedido.cantidad
+    }
+
+def alumno_a_dict(alumno):
+    return {
+        "id": alumno.id,
+        "nombre": alumno.nombre,
+        "apaterno": alumno.apaterno,
+        "apmaterno": alumno.apmaterno,
+        "numafiliacion": alumno.numafiliacion,
+        "telefono": alumno.telefono,
+        "estatus": alumno.estatus,
+        "url": url_for('detalle_alumno', id=alumno.id)
+    }
+
+## Captura de pedidos en lote
+def validar_linea_pedido(fecha, nombre_solicitante, producto):
+    nombre_solicitante = (nombre_solicitante or '').strip()
+    tipo = (producto.get('tipo') or '').strip()
+    talla = (producto.get('talla') or '').strip()
+    if not nombre_solicitante:
+        raise ValueError("falta nombre_solicitante")
+    if not tipo or not talla:
+        raise ValueError("falta tipo o talla del producto")
+    cantidad = int(producto.get('cantidad'))
+    if cantidad < 1:
+        raise ValueError("la cantidad debe ser mayor a cero")
+    return {
+        'fecha': fecha,
+        'nombre_solicitante': nombre_solicitante,
+        'tipo_producto': tipo,
+        'talla': talla,
+        'color': producto.get('color') or None,
+        'cantidad': cantidad
+    }
+
+def validar_lote_pedidos(lineas):
+    """Valida todas las líneas antes de insertar; regresa (filas, errores por línea)."""
+    hoy = date.today()
+    filas, errores = [], []
+    for numero, (nombre_solicitante, producto) in enumerate(lineas, start=1):
+        try:
+            filas.append(validar_linea_pedido(hoy, nombre_solicitante, producto))
+        except (ValueError, TypeError, AttributeError) as e:
+            errores.append({"linea": numero, "error": str(e)})
+    return filas, errores
+
+def insertar_pedidos(session, filas):
+    # Un solo INSERT de varias filas en lugar de un objeto Pedido por línea. Con
+    # sort_by_parameter_order SQLAlchemy insertaría fila por fila; SQLite asigna los ids
+    # en el orden de VALUES, así que ordenarlos los empareja con `filas`
+    if filas:
+        ids = sorted(session.scalars(insert(Pedido).returning(Pedido.id), filas))
+        acumular_pedidos(session, filas)
+        registrar_eventos(session, PEDIDO_CREADO,
+                          [(pedido_id, fila['fecha'], datos_pedido(fila)) for pedido_id, fila in zip(ids, filas)])
+        registrar_cambios_pedidos(session, filas[0]['fecha'], ids)
+        marcar_cambio(session, 'pedidos')
+
+def lineas_lote_pedidos():
+    """Líneas (solicitante, producto) de un CSV o de un arreglo JSON.
+
+    El JSON acepta pedidos con `productos` (como /captura_pedido) o líneas
+    planas con `nombre_solicitante`, `tipo`, `talla`, `color` y `cantidad`;
+    el CSV usa esas mismas columnas.
+    """
+    archivo = request.files.get('archivo')
+    if archivo is not None or request.mimetype == 'text/csv':
+        contenido = archivo.read() if archivo is not None else request.get_data()
+        lector = csv.DictReader(io.StringIO(contenido.decode('utf-8-sig')))
+        return [(fila.get('nombre_solicitante'), fila) for fila in lector]
+
+    data = request.get_json()
+    if not isinstance(data, list):
+        raise ValueError("se esperaba un arreglo JSON o un archivo CSV")
+    lineas = []
+    for item in data:
+        if 'productos' in item:
+            lineas.extend((item.get('nombre_solicitante'), producto) for producto in item['productos'])
+        else:
+            lineas.append((item.get('nombre_solicitante'), item))
+    return lineas
 
 @app.route('/')
 def index():
@@ -67,7 +272,7 @@ def index():
 @app.route('/nuevo_alumno', methods=['GET', 'POST'])
 def registro():
     if request.method == 'POST':
-        session = Session()
+        session = db_session()
         try:
             nuevo_alumno = Alumno(
                 apaterno=request.form['apaterno'],
@@ -84,87 +289,188 @@ def registro():
                 estatus=request.form['estatus']
             )
             session.add(nuevo_alumno)
+            session.flush()
+            registrar_eventos(session, ALUMNO_CREADO, [(nuevo_alumno.id, None, datos_alumno(nuevo_alumno))])
+            marcar_cambio(session, 'alumnos')
             session.commit()
             return jsonify({"success": True, "message": "Alumno registrado correctamente"})
         except Exception as e:
             session.rollback()
             return jsonify({"success": False, "message": f"Error: {str(e)}"})
-        finally:
-            session.close()
     return render_template('registro.html')
 
 @app.route('/captura_pedido', methods=['GET', 'POST'])
 def ingresar_pedido():
     if request.method == 'POST':
-        session = Session()
+        session = db_session()
         try:
             data = request.json
-            for producto in data['productos']:
-                nuevo_pedido = Pedido(
-                    fecha=datetime.now().date(),
-                    nombre_solicitante=data['nombre_solicitante'],
-                    tipo_producto=producto['tipo'],
-                    talla=producto['talla'],
-                    color=producto.get('color'),
-                    cantidad=producto['cantidad']
-                )
-                session.add(nuevo_pedido)
+            filas, errores = validar_lote_pedidos(
+                (data['nombre_solicitante'], producto) for producto in data['productos'])
+            if errores:
+                return jsonify({"success": False, "message": f"Error: {errores[0]['error']}", "errores": errores})
+            insertar_pedidos(session, filas)
             session.commit()
             return jsonify({"success": True, "message": "Pedidos registrados correctamente"})
         except Exception as e:
             session.rollback()
             return jsonify({"success": False, "message": f"Error: {str(e)}"})
-        finally:
-            session.close()
     return render_template('ingresar_pedido.html')
 
+@app.route('/captura_pedidos_lote', methods=['POST'])
+def ingresar_pedidos_lote():
+    session = db_session()
+    try:
+        filas, errores = validar_lote_pedidos(lineas_lote_pedidos())
+        if errores:
+            return jsonify({"success": False, "message": "El lote tiene líneas con errores; no se registró ningún pedido",
+                            "errores": errores}), 400
+        insertar_pedidos(session, filas)
+        session.commit()
+        return jsonify({"success": True, "message": f"{len(filas)} pedidos registrados correctamente",
+                        "registrados": len(filas)})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 400
+
 @app.route('/pedidos_hoy', methods=['GET'])
 def pedidos_hoy():
-    session = Session()
+    """Pedidos de hoy; con `desde` sólo las altas y bajas posteriores a esa versión.
+
+    El cliente guarda la `version` de cada respuesta y la manda como `desde`
+    en la siguiente. Si la `fecha` de la respuesta cambia, debe recargar todo.
+    """
+    session = db_session()
     try:
-        pedidos = session.query(Pedido).filter(Pedido.fecha == datetime.now().date()).all()
-        return jsonify([{
-            "id": pedido.id,
-            "fecha": pedido.fecha.strftime('%Y-%m-%d'),
-            "nombre_solicitante": pedido.nombre_solicitante,
-            "tipo_producto": pedido.tipo_producto,
-            "talla": pedido.talla,
-            "color": pedido.color,
-            "cantidad": pedido.cantidad
-        } for pedido in pedidos])
+        hoy = date.today()
+        desde = request.args.get('desde', type=int)
+        if desde is None:
+            # La versión se lee antes que los pedidos: un cambio intermedio llega otra vez en el siguiente delta
+            version = session.scalar(select(func.max(CambioPedido.version)).where(CambioPedido.fecha == hoy)) or 0
+            pedidos = session.execute(select(*COLUMNAS_PEDIDO).where(Pedido.fecha == hoy).order_by(Pedido.id))
+            return jsonify({"fecha": hoy.isoformat(), "version": version,
+                            "pedidos": [pedido_a_dict(p) for p in pedidos], "eliminados": []})
+
+        cambios = session.execute(
+            select(CambioPedido.version, CambioPedido.pedido_id, CambioPedido.eliminado)
+            .where(CambioPedido.fecha == hoy, CambioPedido.version > desde)
+            .order_by(CambioPedido.version)).all()
+        # El último cambio de cada pedido decide si se agrega o se quita
+        ultimo = {c.pedido_id: c.eliminado for c in cambios}
+        altas = [pedido_id for pedido_id, eliminado in ultimo.items() if not eliminado]
+        pedidos = []
+        if altas:
+            pedidos = session.execute(select(*COLUMNAS_PEDIDO).where(Pedido.id.in_(altas)).order_by(Pedido.id))
+        return jsonify({"fecha": hoy.isoformat(), "version": cambios[-1].version if cambios else desde,
+                        "pedidos": [pedido_a_dict(p) for p in pedidos],
+                        "eliminados": [pedido_id for pedido_id, eliminado in ultimo.items() if eliminado]})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/pedidos')
 def pedidos():
-    session = Session()
+    session = db_session()
     try:
-        pedidos = session.query(Pedido).all()
-        return render_template('pedidos.html', pedidos=pedidos)
+        pedidos, siguiente = pagina_pedidos(session)
+        return render_template('pedidos.html', pedidos=pedidos, siguiente=siguiente)
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        session.close()
+
+@app.route('/api/pedidos')
+def api_pedidos():
+    session = db_session()
+    try:
+        pedidos, siguiente = pagina_pedidos(session, request.args.get('despues'), limite_pagina())
+        return jsonify({"pedidos": [pedido_a_dict(p) for p in pedidos], "siguiente": siguiente})
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Cursor no válido: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+## Estado de pagos de cada alumno en la lista, con los alumnos de la página en una sola consulta
+COLUMNAS_ESTADO_PAGOS = ['id', 'nombre', 'apaterno', 'apmaterno', 'numafiliacion', 'telefono', 'estatus',
+                         'total_pagado', 'num_pagos', 'ultimo_pago', 'meses_cubiertos']
+
+COLUMNAS_ALUMNO_ESTADO = (Alumno.id, Alumno.nombre, Alumno.apaterno, Alumno.apmaterno, Alumno.numafiliacion,
+                          Alumno.telefono, Alumno.estatus)
+
+def rango_pagos():
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    return (date.fromisoformat(desde) if desde else None), (date.fromisoformat(hasta) if hasta else None)
+
+def estado_pagos_a_lista(fila):
+    # Una lista en el orden de COLUMNAS_ESTADO_PAGOS: la página recibe los nombres una sola vez
+    return [fila.ultimo_pago.isoformat() if columna == 'ultimo_pago' and fila.ultimo_pago else fila[i]
+            for i, columna in enumerate(COLUMNAS_ESTADO_PAGOS)]
 
 @app.route('/consulta_alumnos')
 def lista_alumnos():
-    session = Session()
+    session = db_session()
     try:
-        alumnos = session.query(Alumno).all()
-        return render_template('lista_alumnos.html', alumnos=alumnos)
+        desde, hasta = rango_pagos()
+        alumnos, siguiente = pagina_alumnos(session, query=consulta_estado_pagos(session, COLUMNAS_ALUMNO_ESTADO, desde, hasta))
+        return render_template('lista_alumnos.html', alumnos=alumnos, siguiente=siguiente,
+                               desde=desde, hasta=hasta, corte=corte_morosos())
+    except ValueError as e:
+        return f"Parámetro no válido: {str(e)}", 400
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        session.close()
+
+@app.route('/api/estado_pagos')
+def api_estado_pagos():
+    """Alumnos con su total pagado, número de pagos, último pago y meses cubiertos.
+
+    Con `desde`/`hasta` los totales cuentan sólo los pagos de ese rango. Pagina
+    igual que /api/alumnos; `corte` es la fecha desde la que un alumno se
+    considera al corriente (ver /api/morosos).
+    """
+    session = db_session()
+    try:
+        desde, hasta = rango_pagos()
+        alumnos, siguiente = pagina_alumnos(session, request.args.get('despues'), limite_pagina(),
+                                            consulta_estado_pagos(session, COLUMNAS_ALUMNO_ESTADO, desde, hasta))
+        return jsonify({
+            "desde": desde.isoformat() if desde else None,
+            "hasta": hasta.isoformat() if hasta else None,
+            "corte": corte_morosos().isoformat(),
+            "columnas": COLUMNAS_ESTADO_PAGOS,
+            "alumnos": [estado_pagos_a_lista(a) for a in alumnos],
+            "siguiente": siguiente
+        })
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Parámetro no válido: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/alumnos')
+def api_alumnos():
+    session = db_session()
+    try:
+        alumnos, siguiente = pagina_alumnos(session, request.args.get('despues'), limite_pagina())
+        return jsonify({"alumnos": [alumno_a_dict(a) for a in alumnos], "siguiente": siguiente})
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Cursor no válido: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/buscar_alumnos')
+def api_buscar_alumnos():
+    session = db_session()
+    try:
+        limite = max(1, min(request.args.get('limite', 20, type=int), MAX_RESULTADOS))
+        alumnos = buscar_alumnos(session, request.args.get('q', ''), limite)
+        return jsonify({"alumnos": [dict(a, url=url_for('detalle_alumno', id=a['id'])) for a in alumnos]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/actualizar_alumno/<int:id>', methods=['GET', 'POST'])
 def detalle_alumno(id):
-    session = Session()
+    session = db_session()
     try:
         alumno = session.query(Alumno).get(id)
         if request.method == 'POST':
+            antes = datos_alumno(alumno)
             alumno.apaterno = request.form['apaterno']
             alumno.apmaterno = request.form['apmaterno']
             alumno.nombre = request.form['nombre']
@@ -177,36 +483,46 @@ def detalle_alumno(id):
             alumno.telefono = request.form['telefono']
             alumno.numafiliacion = request.form['numafiliacion']
             alumno.estatus = request.form['estatus']
+            cambios = cambios_alumno(antes, datos_alumno(alumno))
+            if cambios:
+                registrar_eventos(session, ALUMNO_ACTUALIZADO, [(alumno.id, None, cambios)])
+            marcar_cambio(session, 'alumnos')
             session.commit()
             return jsonify({"success": True, "message": "Alumno actualizado correctamente"})
         return render_template('detalle_alumno.html', alumno=alumno)
     except Exception as e:
         session.rollback()
         return jsonify({"success": False, "message": f"Error: {str(e)}"})
-    finally:
-        session.close()
 
 @app.route('/eliminar_alumno/<int:id>', methods=['POST'])
 def eliminar_alumno(id):
-    session = Session()
+    session = db_session()
     try:
         alumno = session.query(Alumno).get(id)
+        session.query(SaldoAlumno).filter_by(alumno_id=id).delete()
+        registrar_eventos(session, ALUMNO_ELIMINADO, [(id, None, datos_alumno(alumno))])
         session.delete(alumno)
+        marcar_cambio(session, 'alumnos', 'pagos')
         session.commit()
         return jsonify({"success": True, "message": "Alumno eliminado correctamente"})
     except Exception as e:
         session.rollback()
         return jsonify({"success": False, "message": f"Error: {str(e)}"})
-    finally:
-        session.close()
 
 @app.route('/eliminar_pedido/<int:pedido_id>', methods=['DELETE'])
 def eliminar_pedido(pedido_id):
-    session = Session()
+    session = db_session()
     try:
         pedido = session.query(Pedido).get(pedido_id)
         if pedido:
             session.delete(pedido)
+            acumular_pedidos(session, [{
+                'fecha': pedido.fecha, 'tipo_producto': pedido.tipo_producto, 'talla': pedido.talla,
+                'color': pedido.color, 'cantidad': pedido.cantidad
+            }], signo=-1)
+            registrar_cambios_pedidos(session, pedido.fecha, [pedido.id], eliminado=True)
+            registrar_eventos(session, PEDIDO_ELIMINADO, [(pedido.id, pedido.fecha, datos_pedido(pedido))])
+            marcar_cambio(session, 'pedidos')
             session.commit()
             return jsonify({"success": True, "message": "Pedido eliminado correctamente"})
         else:
@@ -214,12 +530,10 @@ def eliminar_pedido(pedido_id):
     except Exception as e:
         session.rollback()
         return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
-    finally:
-        session.close()
 
 @app.route('/registrar_nuevo_pago/<int:alumno_id>', methods=['GET', 'POST'])
 def pago(alumno_id): #redefinir variable a setpagos para identificar que es el metodo para aplicar pagos
-    session = Session()
+    session = db_session()
     try:
         alumno = session.query(Alumno).get(alumno_id)
         if request.method == 'POST':
@@ -229,416 +543,516 @@ def pago(alumno_id): #redefinir variable a setpagos para identificar que es el m
                 monto=float(request.form['monto']),
                 concepto=request.form['concepto']
             )
+            acumular_pago(session, alumno_id, nuevo_pago.fecha, nuevo_pago.monto)
             session.add(nuevo_pago)
+            session.flush()
+            registrar_eventos(session, PAGO_REGISTRADO, [(nuevo_pago.id, nuevo_pago.fecha, {
+                'alumno_id': alumno_id, 'monto': nuevo_pago.monto, 'concepto': nuevo_pago.concepto})])
+            marcar_cambio(session, 'pagos')
             session.commit()
             return jsonify({"success": True, "message": "Pago registrado correctamente"})
         return render_template('pago.html', alumno=alumno)
     except Exception as e:
         session.rollback()
         return jsonify({"success": False, "message": f"Error: {str(e)}"})
-    finally:
-        session.close()
 
 @app.route('/consulta_de_pagos/<int:alumno_id>')
 def pagos(alumno_id): #redefinit variable a getpagos para identificar que es el listado de pagos
-    session = Session()
+    session = db_session()
     try:
-        alumno = session.query(Alumno).get(alumno_id)
-        pagos = session.query(Pago).filter_by(alumno_id=alumno_id).all()
-        return render_template('pagos.html', alumno=alumno, pagos=pagos)
+        # Alumno, saldo y pagos en una sola consulta
+        alumno, saldo = (session.query(Alumno, SaldoAlumno)
+                         .outerjoin(SaldoAlumno, SaldoAlumno.alumno_id == Alumno.id)
+                         .options(joinedload(Alumno.pagos))
+                         .filter(Alumno.id == alumno_id)
+                         .one())
+        pagos = sorted(alumno.pagos, key=lambda p: p.id)
+        return render_template('pagos.html', alumno=alumno, pagos=pagos, saldo=saldo)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+## Alumnos con pagos atrasados
+ENCABEZADOS_MOROSOS = ['No', 'Nombre', 'Teléfono', 'Email', 'Último Pago', 'Meses Cubiertos', 'Total Pagado']
+COLUMNAS_MOROSOS = (Alumno.id, Alumno.nombre + ' ' + Alumno.apaterno + ' ' + Alumno.apmaterno, Alumno.telefono,
+                    Alumno.email, SaldoAlumno.ultimo_pago, func.coalesce(SaldoAlumno.meses_cubiertos, 0),
+                    func.coalesce(SaldoAlumno.total_pagado, 0))
+
+# Diez años; un corte más lejano no tiene sentido y con valores enormes sale del rango de date
+MAX_MESES_MOROSOS = 120
+
+def corte_morosos():
+    # Moroso: sin pagos en los últimos `meses` meses calendario, contando el actual
+    meses = request.args.get('meses', 1, type=int)
+    if not 1 <= meses <= MAX_MESES_MOROSOS:
+        raise ValueError(f"meses debe estar entre 1 y {MAX_MESES_MOROSOS}")
+    hoy = date.today()
+    mes = hoy.year * 12 + hoy.month - 1 - (meses - 1)
+    return date(mes // 12, mes % 12 + 1, 1)
+
+@app.route('/api/morosos')
+def api_morosos():
+    session = db_session()
+    try:
+        corte = corte_morosos()
+        return jsonify({
+            "corte": corte.isoformat(),
+            "morosos": [{
+                "id": alumno.id,
+                "nombre": f"{alumno.nombre} {alumno.apaterno} {alumno.apmaterno}",
+                "telefono": alumno.telefono,
+                "email": alumno.email,
+                "ultimo_pago": saldo.ultimo_pago.isoformat() if saldo and saldo.ultimo_pago else None,
+                "meses_cubiertos": saldo.meses_cubiertos if saldo else 0,
+                "total_pagado": saldo.total_pagado if saldo else 0
+            } for alumno, saldo in morosos(session, corte)]
+        })
+    except ValueError as e:
+        return jsonify({"error": f"Parámetro no válido: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/generar_reporte_morosos')
+def generar_reporte_morosos():
+    session = db_session()
+    try:
+        corte = corte_morosos()
+
+        def construir(buffer):
+            filas = consulta_morosos(session, corte, *COLUMNAS_MOROSOS).yield_per(500)
+            escribir_excel(buffer, "Alumnos con Pagos Atrasados", ENCABEZADOS_MOROSOS, filas,
+                           logo={'ruta': 'static/img/logo.png', 'ancho': 270, 'alto': 80,
+                                 'celda': 'A1', 'merge': 'A1:B3'},
+                           fila_encabezado=5)
+
+        filename = f"Reporte_Morosos_{date.today():%Y%m%d}.xlsx"
+        return servir_reporte(session, 'morosos_excel', {'corte': corte, 'fecha': date.today()},
+                              ['alumnos', 'pagos'], filename, MIME_XLSX, construir)
+    except ValueError as e:
+        return f"Parámetro no válido: {str(e)}", 400
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+## Importación y exportación masiva de alumnos
+@app.route('/importar_alumnos', methods=['POST'])
+def importar_alumnos_archivo():
+    archivo = request.files.get('archivo')
+    if archivo is None or not archivo.filename:
+        return jsonify({"success": False, "message": "Seleccione un archivo CSV o XLSX"}), 400
+    session = db_session()
+    try:
+        resultado = importar_alumnos(session, leer_archivo(archivo.stream, archivo.filename))
+        mensaje = (f"{resultado['insertados']} alumnos nuevos, {resultado['actualizados']} actualizados, "
+                   f"{resultado['total_errores']} filas con errores")
+        return jsonify(dict(resultado, success=True, message=mensaje))
+    except Exception as e:
+        session.rollback()
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 400
+
+@app.route('/exportar_alumnos')
+def exportar_alumnos():
+    session = db_session()
+    try:
+        if request.args.get('formato') == 'xlsx':
+            def construir(buffer):
+                escribir_excel(buffer, "Alumnos", ENCABEZADOS_IMPORTACION, filas_exportacion(session),
+                               logo={'ruta': 'static/img/logo_excl.png', 'ancho': 440, 'alto': 100,
+                                     'celda': 'I1', 'merge': 'I1:L4'})
+
+            filename = f"Alumnos_{date.today():%Y%m%d}.xlsx"
+            return servir_reporte(session, 'exportar_alumnos', {'fecha': date.today()}, ['alumnos'],
+                                  filename, MIME_XLSX, construir)
+
+        filename = f"Alumnos_{date.today():%Y%m%d}.csv"
+        return Response(stream_with_context(exportar_csv(session)), mimetype='text/csv',
+                        headers={'Content-Disposition': disposicion(filename)})
     except Exception as e:
         return f"Error: {str(e)}"
+
+@app.cli.command('importar-alumnos')
+@click.argument('ruta', type=click.Path(exists=True, dir_okay=False))
+def importar_alumnos_cli(ruta):
+    """Importa (o actualiza por CURP) alumnos desde un CSV o XLSX."""
+    session = Session()
+    try:
+        with open(ruta, 'rb') as archivo:
+            resultado = importar_alumnos(session, leer_archivo(archivo, ruta))
+    finally:
+        session.close()
+    click.echo(f"{resultado['insertados']} nuevos, {resultado['actualizados']} actualizados, "
+               f"{resultado['total_errores']} filas con errores")
+    for error in resultado['errores']:
+        click.echo(f"  fila {error['fila']}: {error['error']}")
+
+@app.cli.command('exportar-alumnos')
+@click.argument('ruta', type=click.Path(dir_okay=False, writable=True))
+def exportar_alumnos_cli(ruta):
+    """Exporta todos los alumnos a un CSV con las columnas de la importación."""
+    session = Session()
+    try:
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            for parte in exportar_csv(session):
+                archivo.write(parte)
     finally:
         session.close()
 
 ## reporte en excel    
 @app.route('/generar_reporte')
 def generar_reporte():
-    session = Session()
+    session = db_session()
     try:
-        alumnos = session.query(Alumno).filter(Alumno.estatus == "activo").all()
-        df = pd.DataFrame([
-            {
-               'No': a.id,
-               'Apellido Paterno': a.apaterno,
-               'Apellido Materno': a.apmaterno,
-               'Nombre': a.nombre,
-               'Fecha de Nacimiento': a.fbday,
-               'CURP': a.curp,
-               'Calle': a.calle,
-               'Número': a.numero,
-               'Colonia': a.colonia,
-               'Email': a.email,
-               'Teléfono': a.telefono,
-               'Número de Afiliación': a.numafiliacion
-            } for a in alumnos
-        ])
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Alumnos"
-
-        # Add logo
-        img = Image('static/img/logo_excl.png')
-        img.width = 440  # Adjust as needed
-        img.height = 100  # Adjust as needed
-        ws.add_image(img, 'I1')
-
-        # Merge cells for the logo
-        ws.merge_cells('I1:L4')
-
-        # Add generation date
-        #ws['E1'] = f"Fecha de generación: {datetime.now().strftime('%Y-%m-%d')}"
-
-        # Write headers
-        headers = list(df.columns)
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=6, column=col, value=header)
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.fill = PatternFill(start_color="000080", end_color="000080", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        # Write data
-        for r, row in enumerate(df.values, start=7):
-            for c, value in enumerate(row, start=1):
-                ws.cell(row=r, column=c, value=value)
-
-        # Adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column_letter].width = adjusted_width
+        def construir(buffer):
+            filas = session.query(*COLUMNAS_ALUMNOS).filter(Alumno.estatus == "activo").yield_per(500)
+            escribir_excel(buffer, "Reporte de Alumnos", ENCABEZADOS_ALUMNOS, filas,
+                           logo={'ruta': 'static/img/logo_excl.png', 'ancho': 440, 'alto': 100,
+                                 'celda': 'I1', 'merge': 'I1:L4'})
 
         filename = f"Reporte_Alumnos_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        wb.save(filename)
+        return servir_reporte(session, 'alumnos_excel', {'fecha': date.today()}, ['alumnos'],
+                              filename, MIME_XLSX, construir)
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-        return send_file(filename, as_attachment=True)
+@app.route('/generar_reporte_pdf')
+def generar_reporte_pdf():
+    session = db_session()
+    try:
+        def construir(buffer):
+            filas = session.query(*COLUMNAS_ALUMNOS_PDF).filter(Alumno.estatus == "activo").yield_per(500)
+            escribir_pdf(buffer, ENCABEZADOS_ALUMNOS_PDF, filas, titulo="Reporte de Alumnos Activos",
+                         logo='static/img/logo_excl.png', pesos=[0.7, 4, 1.6, 3, 1.6, 3, 1.6], horizontal=True)
+
+        filename = f"Reporte_Alumnos_{date.today():%Y%m%d}.pdf"
+        return servir_reporte(session, 'alumnos_pdf', {'fecha': date.today()}, ['alumnos'],
+                              filename, MIME_PDF, construir)
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        session.close()
 
 @app.route('/generar_reporte_pagos/<int:alumno_id>')
 def generar_reporte_pagos(alumno_id):
-    session = Session()
+    session = db_session()
     try:
         alumno = session.query(Alumno).get(alumno_id)
-        pagos = session.query(Pago).filter_by(alumno_id=alumno_id).all()
-        
-        df = pd.DataFrame([
-            {
-                'Fecha Pago': p.fecha,
-                'Monto': p.monto,
-                'Concepto': p.concepto
-            } for p in pagos
-        ])
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Pagos"
-
-        # Add logo
-        img = Image('static/img/logo.png')
-        img.width = 270  # Adjust as needed
-        img.height = 80  # Adjust as needed
-        ws.add_image(img, 'A1')
-
-        # Merge cells for the logo
-        ws.merge_cells('A1:A3')
-
-        # Write headers
-        headers = list(df.columns)
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=5, column=col, value=header)
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.fill = PatternFill(start_color="000080", end_color="000080", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        # Write data
-        for r, row in enumerate(df.values, start=6):
-            for c, value in enumerate(row, start=1):
-                ws.cell(row=r, column=c, value=value)
-
-        # Adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column_letter].width = adjusted_width
+
+        def construir(buffer):
+            filas = session.query(*COLUMNAS_PAGOS).filter(Pago.alumno_id == alumno_id).yield_per(500)
+            escribir_excel(buffer, "Reporte de Pagos", ENCABEZADOS_PAGOS, filas,
+                           logo={'ruta': 'static/img/logo.png', 'ancho': 270, 'alto': 80,
+                                 'celda': 'A1', 'merge': 'A1:A3'},
+                           fila_encabezado=5)
 
         filename = f"Reporte_Pagos_{alumno.nombre}_{alumno.apaterno}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        wb.save(filename)
+        return servir_reporte(session, 'pagos_excel', {'alumno_id': alumno_id, 'fecha': date.today()},
+                              ['alumnos', 'pagos'], filename, MIME_XLSX, construir)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+@app.route('/generar_reporte_pagos_pdf/<int:alumno_id>')
+def generar_reporte_pagos_pdf(alumno_id):
+    session = db_session()
+    try:
+        alumno = session.query(Alumno).get(alumno_id)
+
+        def construir(buffer):
+            filas = (session.query(*COLUMNAS_PAGOS).filter(Pago.alumno_id == alumno_id)
+                     .order_by(Pago.fecha).yield_per(500))
+            escribir_pdf(buffer, ENCABEZADOS_PAGOS, filas,
+                         titulo=f"Pagos de {alumno.nombre} {alumno.apaterno} {alumno.apmaterno}",
+                         pesos=[1, 1, 3], columnas_suma=[1])
 
-        return send_file(filename, as_attachment=True)
+        filename = f"Reporte_Pagos_{alumno.nombre}_{alumno.apaterno}_{date.today():%Y%m%d}.pdf"
+        return servir_reporte(session, 'pagos_pdf', {'alumno_id': alumno_id, 'fecha': date.today()},
+                              ['alumnos', 'pagos'], filename, MIME_PDF, construir)
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        session.close()
 
-@app.route('/generar_reporte_pedidos_excel')
-def generar_reporte_pedidos_excel():
-    session = Session()
+def reporte_pedidos_excel(session, buffer, fecha=None):
+    query = session.query(*COLUMNAS_REPORTE_PEDIDOS)
+    titulo = "Reporte de Pedidos"
+    if fecha is not None:
+        query = query.filter(Pedido.fecha == fecha)
+        titulo = f"Pedidos del {fecha:%Y-%m-%d}"
+    escribir_excel(buffer, titulo, ENCABEZADOS_PEDIDOS, query.yield_per(500),
+                   logo=LOGO_PEDIDOS, factor_ancho=1.8)
+
+def reporte_pedidos_pdf(session, buffer, fecha=None):
+    query = session.query(*COLUMNAS_REPORTE_PEDIDOS)
+    titulo = "Reporte de Pedidos"
+    if fecha is not None:
+        query = query.filter(Pedido.fecha == fecha)
+        titulo = f"Reporte de Pedidos del {fecha:%Y-%m-%d}"
+    escribir_pdf(buffer, ENCABEZADOS_PEDIDOS, query.yield_per(500), titulo=titulo,
+                 pesos=[2, 4, 3, 1.5, 2, 1.5], columnas_suma=[5])
+
+# tipo -> (construir, sólo pedidos del día, nombre del archivo, mimetype)
+REPORTES_PEDIDOS = {
+    'pedidos_excel': (reporte_pedidos_excel, False, 'Reporte_Pedidos_{:%Y%m%d}.xlsx', MIME_XLSX),
+    'pedidos_hoy_excel': (reporte_pedidos_excel, True, 'Reporte_Pedidos_Hoy_{:%Y%m%d}.xlsx', MIME_XLSX),
+    'pedidos_pdf': (reporte_pedidos_pdf, False, 'reporte_pedidos.pdf', MIME_PDF),
+    'pedidos_hoy_pdf': (reporte_pedidos_pdf, True, 'reporte_pedidos_hoy.pdf', MIME_PDF),
+}
+
+# Reportes del día que se sirven del archivo cuando está al día
+FORMATO_ARCHIVO = {'pedidos_hoy_excel': 'xlsx', 'pedidos_hoy_pdf': 'pdf'}
+
+def servir_reporte_pedidos(tipo):
+    session = db_session()
     try:
-        pedidos = session.query(Pedido).all()
-        
-        df = pd.DataFrame([
-            {
-                'Fecha': p.fecha,
-                'Solicitante': p.nombre_solicitante,
-                'Producto': p.tipo_producto,
-                'Talla': p.talla,
-                'Color': p.color or 'N/A',
-                'Cantidad': p.cantidad
-            } for p in pedidos
-        ])
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Pedidos"
-
-        # Add logo
-        img = Image('static/img/logo.png')
-        img.width = 480
-        img.height = 100
-        ws.add_image(img, 'B1')
-
-        # Merge cells for the logo
-        ws.merge_cells('A1:F5')
-
-        # Add generation date
-        #ws['E1'] = f"Fecha de generación: {datetime.now().strftime('%Y-%m-%d')}"
-
-        # Write headers
-        headers = list(df.columns)
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=6, column=col, value=header)
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.fill = PatternFill(start_color="000080", end_color="000080", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        # Write data
-        for r, row in enumerate(df.values, start=7):
-            for c, value in enumerate(row, start=1):
-                ws.cell(row=r, column=c, value=value)
-
-        # Adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.8
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        filename = f"Reporte_Pedidos_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        wb.save(filename)
-
-        return send_file(filename, as_attachment=True)
+        construir, solo_hoy, filename, mimetype = REPORTES_PEDIDOS[tipo]
+        hoy = date.today()
+        if tipo in FORMATO_ARCHIVO:
+            archivado = archivo.vigente(session, hoy, FORMATO_ARCHIVO[tipo])
+            if archivado is not None:
+                return servir_archivo(*archivado, filename.format(hoy), mimetype)
+        return servir_reporte(session, tipo, {'fecha': hoy}, ['pedidos'], filename.format(hoy), mimetype,
+                              lambda buffer: construir(session, buffer, hoy if solo_hoy else None))
     except Exception as e:
         return f"Error: {str(e)}"
-    finally:
-        session.close()
+
+@app.route('/generar_reporte_pedidos_excel')
+def generar_reporte_pedidos_excel():
+    return servir_reporte_pedidos('pedidos_excel')
 
 @app.route('/generar_reporte_pedidos_hoy_excel')
 def generar_reporte_pedidos_hoy_excel():
+    return servir_reporte_pedidos('pedidos_hoy_excel')
+
+@app.route('/generar_reporte_pedidos_pdf')
+def generar_reporte_pedidos_pdf():
+    return servir_reporte_pedidos('pedidos_pdf')
+
+@app.route('/generar_reporte_pedidos_hoy_pdf')
+def generar_reporte_pedidos_hoy_pdf():
+    return servir_reporte_pedidos('pedidos_hoy_pdf')
+
+@app.cli.command('construir-activos')
+def construir_activos_cli():
+    """Publica static/ en static/dist con huellas, copias comprimidas y logos redimensionados."""
+    manifiesto = construir_activos(app.static_folder)
+    activos.recargar()
+    for original, publicado in sorted(manifiesto.items()):
+        click.echo(f"{original} -> {publicado}")
+
+## Archivo por fecha de los reportes de pedidos del día
+CONSTRUCTORES_ARCHIVO = {'xlsx': reporte_pedidos_excel, 'pdf': reporte_pedidos_pdf}
+MIME_ARCHIVO = {'xlsx': MIME_XLSX, 'pdf': MIME_PDF}
+
+def archivar_pedidos(fecha, forzar=False):
     session = Session()
     try:
-        pedidos = session.query(Pedido).filter(Pedido.fecha == date.today()).all()
-        
-        df = pd.DataFrame([
-            {
-                'Fecha': p.fecha,
-                'Solicitante': p.nombre_solicitante,
-                'Producto': p.tipo_producto,
-                'Talla': p.talla,
-                'Color': p.color or 'N/A',
-                'Cantidad': p.cantidad
-            } for p in pedidos
-        ])
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Pedidos de Hoy"
-
-        # Add logo
-        img = Image('static/img/logo.png')
-        img.width = 480
-        img.height = 100
-        ws.add_image(img, 'B1')
-
-        # Merge cells for the logo
-        ws.merge_cells('A1:F5')
-
-        # Add generation date
-        #ws['E1'] = f"Fecha de generación: {datetime.now().strftime('%Y-%m-%d')}"
-
-        # Write headers
-        headers = list(df.columns)
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=6, column=col, value=header)
-            cell.font = Font(color="FFFFFF", bold=True)
-            cell.fill = PatternFill(start_color="000080", end_color="000080", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        # Write data
-        for r, row in enumerate(df.values, start=7):
-            for c, value in enumerate(row, start=1):
-                ws.cell(row=r, column=c, value=value)
-
-        # Adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.8
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        filename = f"Reporte_Pedidos_Hoy_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        wb.save(filename)
-
-        return send_file(filename, as_attachment=True)
+        with metricas.medir_reporte('archivo_pedidos'):
+            return archivo.archivar(session, fecha, CONSTRUCTORES_ARCHIVO, forzar)
+    finally:
+        session.close()
+
+def servir_archivo(ruta, firma, filename, mimetype):
+    etag = f'"{firma}-{os.path.splitext(ruta)[1]}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={'ETag': etag})
+    respuesta = enviar_reporte(open(ruta, 'rb'), filename, mimetype)
+    respuesta.headers['ETag'] = etag
+    return respuesta
+
+@app.route('/reporte_pedidos_dia')
+def reporte_pedidos_dia():
+    """Reporte de pedidos de una fecha: se sirve del archivo y sólo se arma si cambió."""
+    session = db_session()
+    try:
+        fecha = date.fromisoformat(request.args.get('fecha') or date.today().isoformat())
+        formato = request.args.get('formato', 'xlsx')
+        # Sin pedidos no hay nada que archivar; así una fecha cualquiera no crea carpetas
+        if formato not in FORMATOS_ARCHIVO or fecha > date.today() or \
+                session.query(Pedido.id).filter(Pedido.fecha == fecha).first() is None:
+            return jsonify({"success": False, "message": "Reporte no disponible"}), 404
+        filename = FORMATOS_ARCHIVO[formato].format(fecha)
+        archivado = archivo.vigente(session, fecha, formato)
+        if archivado is None:
+            # Se sirve lo que se acaba de escribir: con la captura en curso la firma puede
+            # cambiar otra vez antes de terminar, y el siguiente GET lo vuelve a armar
+            try:
+                cola.ejecutar(archivar_pedidos, fecha)
+            except OSError:
+                app.logger.exception("No se pudo archivar el reporte de pedidos del %s", fecha)
+            archivado = archivo.archivado(fecha, formato)
+        if archivado is None:
+            construir = CONSTRUCTORES_ARCHIVO[formato]
+            return servir_reporte(session, f'pedidos_dia_{formato}', {'fecha': fecha}, ['pedidos'], filename,
+                                  MIME_ARCHIVO[formato], lambda buffer: construir(session, buffer, fecha))
+        return servir_archivo(*archivado, filename, MIME_ARCHIVO[formato])
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Fecha no válida: {str(e)}"}), 400
     except Exception as e:
         return f"Error: {str(e)}"
+
+@app.cli.command('archivar-pedidos')
+@click.option('--fecha', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Fecha de los pedidos (por omisión, hoy).')
+@click.option('--forzar', is_flag=True, help='Regenera aunque los pedidos no hayan cambiado.')
+def archivar_pedidos_cli(fecha, forzar):
+    """Arma y archiva los reportes de pedidos del día; pensado para cron a la hora de corte."""
+    fecha = fecha.date() if fecha else date.today()
+    if archivar_pedidos(fecha, forzar):
+        click.echo(f"Reportes de {fecha} archivados en {archivo.carpeta(fecha)}")
+    else:
+        click.echo(f"Los reportes de {fecha} ya estaban al día")
+
+if ARCHIVO_AUTOMATICO:
+    ProgramadorArchivo(archivar_pedidos).iniciar()
+
+## Registro de eventos: reconstrucción de resúmenes, compactación e historial
+@app.cli.command('reconstruir-resumenes')
+@click.option('--lote', type=int, default=50000, show_default=True, help='Eventos leídos por bloque.')
+@click.option('--verificar', is_flag=True, help='Sólo compara los resúmenes actuales con el registro.')
+def reconstruir_resumenes_cli(lote, verificar):
+    """Reconstruye los totales diarios de pedidos y los saldos de alumnos desde el registro de eventos."""
+    session = Session()
+    try:
+        if verificar:
+            diferencias = diferencias_resumenes(session, lote)
+            for tabla, llave, actual, esperado in diferencias[:50]:
+                click.echo(f"{tabla} {llave}: actual {actual}, según eventos {esperado}")
+            click.echo(f"{len(diferencias)} diferencias")
+            return
+        eventos = reconstruir_resumenes(session, lote)
+        session.commit()
+        click.echo(f"Resúmenes reconstruidos a partir de {eventos} eventos")
     finally:
         session.close()
 
-## Reporte en pdf
-@app.route('/generar_reporte_pedidos_pdf')
-def generar_reporte_pedidos_pdf():
+@app.cli.command('compactar-eventos')
+@click.option('--antes-de', 'antes_de', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='Compacta los eventos registrados antes de esta fecha.')
+@click.option('--lote', type=int, default=50000, show_default=True, help='Eventos leídos por bloque.')
+def compactar_eventos_cli(antes_de, lote):
+    """Reemplaza los eventos de pedidos y pagos anteriores a una fecha por totales diarios y saldos."""
     session = Session()
     try:
-        pedidos = session.query(Pedido).all()
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        # Add logo
-        logo = PDFImage('static/img/logo.png', width=100, height=50)
-        elements.append(logo)
-
-        # Create table data
-        data = [['Fecha', 'Solicitante', 'Producto', 'Talla', 'Color', 'Cantidad']]
-        for pedido in pedidos:
-            data.append([
-                pedido.fecha.strftime('%Y-%m-%d'),
-                pedido.nombre_solicitante,
-                pedido.tipo_producto,
-                pedido.talla,
-                pedido.color or 'N/A',
-                pedido.cantidad
-            ])
-
-        # Create table
-        table = Table(data)
-        style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.blue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 12),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ])
-        table.setStyle(style)
-        elements.append(table)
-
-        # Build PDF
-        doc.build(elements)
-
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name='reporte_pedidos.pdf', mimetype='application/pdf')
-    except Exception as e:
-        return f"Error: {str(e)}"
+        borrados, resumenes = compactar(session, antes_de, lote)
+        session.commit()
     finally:
         session.close()
+    click.echo(f"{borrados} eventos reemplazados por {resumenes} eventos de resumen")
 
-@app.route('/generar_reporte_pedidos_hoy_pdf')
-def generar_reporte_pedidos_hoy_pdf():
+@app.cli.command('historial-pedidos')
+@click.option('--fecha', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+def historial_pedidos_cli(fecha):
+    """Pedidos registrados para una fecha según el registro de eventos, incluidos los eliminados."""
     session = Session()
     try:
-        pedidos = session.query(Pedido).filter(Pedido.fecha == date.today()).all()
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        # Add logo
-        logo = PDFImage('static/img/logo.png', width=100, height=50)
-        elements.append(logo)
-
-        # Create table data
-        data = [['Fecha', 'Solicitante', 'Producto', 'Talla', 'Color', 'Cantidad']]
-        for pedido in pedidos:
-            data.append([
-                pedido.fecha.strftime('%Y-%m-%d'),
-                pedido.nombre_solicitante,
-                pedido.tipo_producto,
-                pedido.talla,
-                pedido.color or 'N/A',
-                pedido.cantidad
-            ])
-
-        # Create table
-        table = Table(data)
-        style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.blue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 12),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ])
-        table.setStyle(style)
-        elements.append(table)
-
-        # Build PDF
-        doc.build(elements)
-
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name='reporte_pedidos_hoy.pdf', mimetype='application/pdf')
+        pedidos = pedidos_de_fecha(session, fecha.date())
+    finally:
+        session.close()
+    for p in pedidos:
+        baja = f"  (eliminado {p['eliminado']:%Y-%m-%d %H:%M})" if p['eliminado'] else ''
+        click.echo(f"{p['id']:>8}  {p['nombre_solicitante']}  {p['tipo_producto']} {p['talla']} "
+                   f"{p['color'] or ''} x{p['cantidad']}{baja}")
+    click.echo(f"{len(pedidos)} pedidos, {sum(1 for p in pedidos if p['eliminado'])} eliminados")
+
+## Totales de pedidos para el proveedor
+ENCABEZADOS_AGREGADO = ['Producto', 'Talla', 'Color', 'Cantidad']
+
+def rango_fechas():
+    desde = request.args.get('desde')
+    desde = date.fromisoformat(desde) if desde else date.today()
+    hasta = request.args.get('hasta')
+    hasta = date.fromisoformat(hasta) if hasta else desde
+    return desde, hasta
+
+@app.route('/api/agregado_pedidos')
+def api_agregado_pedidos():
+    session = db_session()
+    try:
+        desde, hasta = rango_fechas()
+        totales = totales_pedidos(session, desde, hasta)
+        return jsonify({
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "totales": [{"tipo_producto": t, "talla": talla, "color": color or None, "cantidad": cantidad}
+                        for t, talla, color, cantidad in totales]
+        })
+    except ValueError as e:
+        return jsonify({"error": f"Fecha no válida: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def servir_reporte_agregado(formato):
+    session = db_session()
+    try:
+        desde, hasta = rango_fechas()
+
+        def construir(buffer):
+            filas = [(t, talla, color or 'N/A', cantidad) for t, talla, color, cantidad
+                     in totales_pedidos(session, desde, hasta)]
+            if formato == 'excel':
+                escribir_excel(buffer, "Totales de Pedidos", ENCABEZADOS_AGREGADO, filas,
+                               logo=LOGO_PEDIDOS | {'merge': 'A1:D5'}, factor_ancho=1.8)
+            else:
+                escribir_pdf(buffer, ENCABEZADOS_AGREGADO, filas, titulo="Totales de Pedidos",
+                             pesos=[3, 1.5, 2, 1.5], columnas_suma=[3])
+
+        extension, mimetype = ('xlsx', MIME_XLSX) if formato == 'excel' else ('pdf', MIME_PDF)
+        filename = f"Totales_Pedidos_{desde:%Y%m%d}_{hasta:%Y%m%d}.{extension}"
+        return servir_reporte(session, f'agregado_{formato}', {'desde': desde, 'hasta': hasta}, ['pedidos'],
+                              filename, mimetype, construir)
     except Exception as e:
         return f"Error: {str(e)}"
+
+@app.route('/generar_reporte_agregado_pedidos_excel')
+def generar_reporte_agregado_pedidos_excel():
+    return servir_reporte_agregado('excel')
+
+@app.route('/generar_reporte_agregado_pedidos_pdf')
+def generar_reporte_agregado_pedidos_pdf():
+    return servir_reporte_agregado('pdf')
+
+## Reportes en segundo plano
+def generar_reporte_pedidos(tipo, hoy):
+    construir, solo_hoy, filename, mimetype = REPORTES_PEDIDOS[tipo]
+    session = Session()
+    try:
+        clave = clave_reporte(tipo, {'fecha': hoy}, versiones_tablas(session, ['pedidos']))
+        entrada = cache.obtener(clave)
+        if entrada is None:
+            buffer = buffer_reporte()
+            with metricas.medir_reporte(tipo):
+                construir(session, buffer, hoy if solo_hoy else None)
+            entrada = (leer_buffer(buffer), filename.format(hoy), mimetype)
+            cache.guardar(clave, *entrada)
+        return entrada
     finally:
         session.close()
-##Fin --> declaración para ejecución de app.py
+
+@app.route('/reportes', methods=['POST'])
+def iniciar_reporte():
+    datos = request.get_json(silent=True) or request.form
+    tipo = datos.get('tipo')
+    if tipo not in REPORTES_PEDIDOS:
+        return jsonify({"success": False, "message": "Tipo de reporte no válido"}), 400
+    try:
+        trabajo = cola.enviar(tipo, generar_reporte_pedidos, tipo, date.today())
+    except ColaLlena as e:
+        return jsonify({"success": False, "message": str(e)}), 429
+    return jsonify({"success": True, "id": trabajo.id,
+                    "estado_url": url_for('estado_reporte', trabajo_id=trabajo.id)}), 202
+
+@app.route('/reportes/<trabajo_id>')
+def estado_reporte(trabajo_id):
+    trabajo = cola.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({"success": False, "message": "Reporte no encontrado"}), 404
+    datos = trabajo.a_dict()
+    if trabajo.estado == LISTO:
+        datos['descarga_url'] = url_for('descargar_reporte', trabajo_id=trabajo.id)
+    return jsonify(datos)
+
+@app.route('/reportes/<trabajo_id>/descarga')
+def descargar_reporte(trabajo_id):
+    trabajo = cola.obtener(trabajo_id)
+    if trabajo is None or trabajo.estado != LISTO:
+        return jsonify({"success": False, "message": "Reporte no disponible"}), 404
+    contenido, filename, mimetype = trabajo.resultado
+    return enviar_reporte(BytesIO(contenido), filename, mimetype)
+
+##Fin --> declaración para ejecución de app.py (servidor de desarrollo; en producción `gunicorn app:app`, ver gunicorn.conf.py)
 if __name__ == '__main__':
     #port = int(os.environ.get("PORT", 5000))
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
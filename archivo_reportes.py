@@ -0,0 +1,149 @@
+## Archivo por fecha de los reportes de pedidos del día (el pedido al proveedor)
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time
+
+from sqlalchemy import func
+
+from database import CambioPedido, Pedido
+from trabajos import bajar_prioridad
+
+logger = logging.getLogger(__name__)
+
+# Carpeta del archivo; un subdirectorio por fecha
+DIRECTORIO_ARCHIVO = os.environ.get('ALUMNOS_ARCHIVO_REPORTES', 'archivo_reportes')
+# Hora de corte a partir de la cual el programador arma los reportes del día
+CORTE_PEDIDOS = time.fromisoformat(os.environ.get('ALUMNOS_CORTE_PEDIDOS', '18:00'))
+# Segundos entre revisiones después del corte; sólo se regenera si cambiaron los pedidos
+INTERVALO_ARCHIVO = int(os.environ.get('ALUMNOS_ARCHIVO_INTERVALO', '300'))
+ARCHIVO_AUTOMATICO = os.environ.get('ALUMNOS_ARCHIVO_AUTOMATICO', '0') == '1'
+
+FORMATOS = {'xlsx': 'Reporte_Pedidos_{:%Y%m%d}.xlsx', 'pdf': 'Reporte_Pedidos_{:%Y%m%d}.pdf'}
+
+
+def firma_pedidos(session, fecha):
+    """Resume los pedidos de una fecha; cambia con cada alta o baja de ese día.
+
+    Hoy se usa la última versión de cambios_pedidos, que nunca se repite: borrar
+    el último pedido y capturarlo de nuevo reutiliza su id y puede dejar igual
+    el conteo y la suma. A los días anteriores sólo se les borran pedidos, así
+    que basta con el conteo.
+    """
+    total = session.query(func.count(Pedido.id)).filter(Pedido.fecha == fecha).scalar()
+    partes = [fecha.isoformat(), total]
+    if fecha == date.today():
+        partes.append(session.query(func.max(CambioPedido.version)).filter(CambioPedido.fecha == fecha).scalar())
+    contenido = json.dumps(partes)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:32]
+
+
+class ArchivoPedidos:
+    def __init__(self, directorio=DIRECTORIO_ARCHIVO):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+
+    def carpeta(self, fecha):
+        return os.path.join(self.directorio, f'{fecha:%Y}', fecha.isoformat())
+
+    def ruta(self, fecha, formato):
+        return os.path.join(self.carpeta(fecha), FORMATOS[formato].format(fecha))
+
+    def _firma_guardada(self, fecha):
+        try:
+            with open(os.path.join(self.carpeta(fecha), 'firma.json'), encoding='utf-8') as f:
+                return json.load(f)['firma']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def vigente(self, session, fecha, formato):
+        """Ruta y firma del reporte archivado si sigue al día con los pedidos; si no, None."""
+        firma = firma_pedidos(session, fecha)
+        ruta = self.ruta(fecha, formato)
+        if self._firma_guardada(fecha) == firma and os.path.exists(ruta):
+            return ruta, firma
+        return None
+
+    def archivado(self, fecha, formato):
+        """Ruta y firma del último reporte archivado, esté o no al día; None si no hay.
+
+        Se lee bajo el mismo lock que archivar(), así la firma corresponde al
+        archivo que se escribió con ella.
+        """
+        with self._lock:
+            firma = self._firma_guardada(fecha)
+            ruta = self.ruta(fecha, formato)
+            if firma is not None and os.path.exists(ruta):
+                return ruta, firma
+            return None
+
+    def archivar(self, session, fecha, constructores, forzar=False):
+        """Arma los reportes de `fecha` si los pedidos cambiaron desde la última vez.
+
+        `constructores` es un dict formato -> construir(session, archivo, fecha).
+        Cada archivo se escribe aparte y se mueve a su lugar al terminar, así que
+        quien lo sirve nunca ve uno a medias. Regresa True si se regeneró.
+        """
+        with self._lock:
+            firma = firma_pedidos(session, fecha)
+            if not forzar and self._firma_guardada(fecha) == firma and \
+                    all(os.path.exists(self.ruta(fecha, formato)) for formato in constructores):
+                return False
+            carpeta = self.carpeta(fecha)
+            os.makedirs(carpeta, exist_ok=True)
+            for formato, construir in constructores.items():
+                self._escribir(carpeta, self.ruta(fecha, formato), lambda f: construir(session, f, fecha))
+            self._escribir(carpeta, os.path.join(carpeta, 'firma.json'), lambda f: f.write(json.dumps({
+                'firma': firma, 'generado': datetime.now().isoformat(timespec='seconds')}).encode('utf-8')))
+            return True
+
+    @staticmethod
+    def _escribir(carpeta, destino, escribir):
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                escribir(f)
+            os.replace(temporal, destino)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+
+class ProgramadorArchivo:
+    """Hilo que archiva los reportes del día a la hora de corte y después de cada cambio."""
+
+    def __init__(self, tarea, corte=CORTE_PEDIDOS, intervalo=INTERVALO_ARCHIVO):
+        self.tarea = tarea
+        self.corte = corte
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='archivo-reportes', daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _espera(self):
+        ahora = datetime.now()
+        corte = datetime.combine(ahora.date(), self.corte)
+        if ahora < corte:
+            return (corte - ahora).total_seconds()
+        return self.intervalo
+
+    def _ciclo(self):
+        bajar_prioridad()
+        while not self._detener.wait(self._espera()):
+            try:
+                self.tarea(date.today())
+            except Exception:
+                logger.exception("No se pudo archivar el reporte de pedidos")
+
+
+archivo = ArchivoPedidos()
@@ -0,0 +1,83 @@
+"""Tiempo de arranque y memoria de un worker, con y sin precargar las librerías de reportes.
+
+Cada medición corre en un proceso nuevo: importa app.py, atiende la página de
+inicio y después el primer reporte, y reporta el tiempo y la memoria
+residente (RSS) después de cada paso.
+
+Uso: python benchmarks/arranque.py [--repeticiones N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Lo que corre dentro de cada proceso medido
+WORKER = r'''
+import json, time
+inicio = time.perf_counter()
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+from app import app
+importado = time.perf_counter()
+memoria_arranque = rss_mb()
+client = app.test_client()
+client.get('/').get_data()
+inicio_listo = time.perf_counter()
+memoria_inicio = rss_mb()
+client.get('/generar_reporte').get_data()
+reporte = time.perf_counter()
+print(json.dumps({
+    'importar_app_ms': (importado - inicio) * 1000,
+    'primera_peticion_ms': (inicio_listo - inicio) * 1000,
+    'primer_reporte_ms': (reporte - inicio_listo) * 1000,
+    'rss_arranque_mb': memoria_arranque,
+    'rss_inicio_mb': memoria_inicio,
+    'rss_reporte_mb': rss_mb(),
+}))
+'''
+
+MODOS = {'sin precarga': '0', 'con precarga': '1'}
+
+
+def medir_proceso(entorno):
+    salida = subprocess.run([sys.executable, '-c', WORKER], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        entorno = dict(os.environ, ALUMNOS_DB_URL=f"sqlite:///{os.path.join(tmp, 'AlumnosTB.db')}")
+        # El primer proceso crea la base; no se cuenta
+        medir_proceso(entorno)
+
+        resultados = {}
+        for modo, precargar in MODOS.items():
+            entorno['ALUMNOS_PRECARGAR_REPORTES'] = precargar
+            corridas = [medir_proceso(entorno) for _ in range(args.repeticiones)]
+            resultados[modo] = {clave: statistics.median(c[clave] for c in corridas) for clave in corridas[0]}
+
+    claves = list(next(iter(resultados.values())))
+    print(f"{'mediana de ' + str(args.repeticiones) + ' procesos':<26}" + ''.join(f'{m:>16}' for m in MODOS))
+    for clave in claves:
+        print(f'{clave:<26}' + ''.join(f'{resultados[m][clave]:>16.1f}' for m in MODOS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Latencia de la captura de pedidos con y sin un reporte generándose a la vez.
+
+Levanta el servidor en un subproceso sobre una base SQLite temporal, manda
+pedidos a /captura_pedido desde varios clientes concurrentes (como las
+tabletas en un torneo) y repite la medición mientras otro cliente descarga
+un reporte grande una y otra vez. Con el servidor de producción la latencia
+de la captura debe mantenerse casi igual en las dos fases.
+
+Uso: python benchmarks/carga.py [--servidor gunicorn|dev] [--clientes N]
+                                [--pedidos-por-cliente N] [--pedidos N]
+                                [--reporte URL]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+from rendimiento import percentil  # noqa: E402
+
+PRODUCTO = {'tipo': 'peto', 'talla': 'MD', 'color': 'azul', 'cantidad': 1}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def comando_servidor(servidor, puerto):
+    if servidor == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+    # El servidor de desarrollo de Werkzeug, como con `python app.py` pero sin recargador
+    return [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={puerto})"]
+
+
+def esperar(url, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {limite} s")
+
+
+def capturar(base, cliente, i):
+    cuerpo = json.dumps({'nombre_solicitante': f'Carga{cliente}-{i}', 'productos': [PRODUCTO] * 3}).encode()
+    peticion = urllib.request.Request(f'{base}/captura_pedido', data=cuerpo,
+                                      headers={'Content-Type': 'application/json'})
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+        resultado = json.load(respuesta)
+    if not resultado.get('success'):
+        raise RuntimeError(resultado.get('message'))
+    return time.perf_counter() - inicio
+
+
+def fase(base, clientes, por_cliente, reporte=None):
+    """Latencias de captura; con `reporte`, otro hilo lo descarga sin parar mientras tanto."""
+    latencias = []
+    lock = threading.Lock()
+    terminado = threading.Event()
+    reportes = []
+
+    def cliente(n):
+        propias = [capturar(base, n, i) for i in range(por_cliente)]
+        with lock:
+            latencias.extend(propias)
+
+    def descargar():
+        while not terminado.is_set():
+            inicio = time.perf_counter()
+            urllib.request.urlopen(f'{base}{reporte}', timeout=300).read()
+            reportes.append(time.perf_counter() - inicio)
+
+    fondo = None
+    if reporte:
+        fondo = threading.Thread(target=descargar)
+        fondo.start()
+        time.sleep(0.5)  # que el primer reporte ya esté generándose
+    hilos = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    if fondo:
+        fondo.join()
+    if len(latencias) != clientes * por_cliente:
+        raise RuntimeError("Fallaron capturas de pedidos; el detalle está arriba")
+    return {
+        'peticiones': len(latencias),
+        'por_segundo': len(latencias) / duracion,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'max_ms': max(latencias) * 1000,
+        'reportes': len(reportes),
+        'reporte_ms': sum(reportes) / len(reportes) * 1000 if reportes else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servidor', choices=('gunicorn', 'dev'), default='gunicorn')
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--pedidos-por-cliente', type=int, default=50)
+    parser.add_argument('--pedidos', type=int, default=100000, help='pedidos sembrados antes de medir')
+    parser.add_argument('--reporte', default='/generar_reporte_pedidos_pdf',
+                        help='ruta del reporte que se genera durante la segunda fase')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url_db = f"sqlite:///{os.path.join(tmp, 'AlumnosTB.db')}"
+        os.environ['ALUMNOS_DB_URL'] = url_db
+        import database
+        from plan_consultas import sembrar
+        database.Base.metadata.create_all(database.engine)
+        sembrar(database.engine, 500, 1000, args.pedidos)
+        database.engine.dispose()
+
+        puerto = puerto_libre()
+        entorno = dict(os.environ, ALUMNOS_DB_URL=url_db, ALUMNOS_BIND=f'127.0.0.1:{puerto}',
+                       ALUMNOS_ACCESS_LOG='', ALUMNOS_ARCHIVO_REPORTES=os.path.join(tmp, 'archivo'))
+        proceso = subprocess.Popen(comando_servidor(args.servidor, puerto), cwd=RAIZ, env=entorno,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f'http://127.0.0.1:{puerto}'
+        try:
+            esperar(f'{base}/')
+            fase(base, args.clientes, 5)  # calentamiento
+            resultados = {
+                'sin reporte': fase(base, args.clientes, args.pedidos_por_cliente),
+                'con reporte': fase(base, args.clientes, args.pedidos_por_cliente, args.reporte),
+            }
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    print(f"servidor {args.servidor}, {args.clientes} clientes, {args.pedidos} pedidos sembrados, "
+          f"reporte {args.reporte}")
+    print(f"{'fase':<14}{'pet/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'reportes':>16}")
+    for nombre, r in resultados.items():
+        reportes = f"{r['reportes']} x {r['reporte_ms']:.0f} ms" if r['reportes'] else '-'
+        print(f"{nombre:<14}{r['por_segundo']:>8.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}{reportes:>16}")
+    sin, con = resultados['sin reporte'], resultados['con reporte']
+    print(f"\np95 con reporte / sin reporte: {con['p95_ms'] / sin['p95_ms']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
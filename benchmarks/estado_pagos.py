@@ -0,0 +1,97 @@
+"""Estado de pagos de una página de alumnos: una petición contra una por alumno.
+
+Compara dos formas de ver los pagos de los 50 alumnos de una página:
+
+- por alumno: la página de /api/alumnos y después /consulta_de_pagos/<id>
+  de cada alumno, como se revisaban uno por uno;
+- estado de pagos: una sola llamada a /api/estado_pagos (también con rango
+  de fechas).
+
+De cada forma reporta la mediana del tiempo, las consultas SQL y los bytes
+transferidos por página.
+
+Uso: python benchmarks/estado_pagos.py [--alumnos N] [--pagos N] [--paginas N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+
+def por_alumno(client, cursor, rango):
+    url = '/api/alumnos' + (f'?despues={cursor}' if cursor else '')
+    respuesta = client.get(url)
+    datos, total = respuesta.get_json(), len(respuesta.get_data())
+    for alumno in datos['alumnos']:
+        total += len(client.get(f"/consulta_de_pagos/{alumno['id']}").get_data())
+    return datos['siguiente'], total
+
+
+def estado_pagos(client, cursor, rango):
+    parametros = dict(rango, **({'despues': cursor} if cursor else {}))
+    respuesta = client.get('/api/estado_pagos', query_string=parametros)
+    return respuesta.get_json()['siguiente'], len(respuesta.get_data())
+
+
+def medir(client, contador, flujo, paginas, rango=None):
+    tiempos, consultas, bytes_ = [], [], []
+    cursor = None
+    for _ in range(paginas):
+        contador[0] = 0
+        inicio = time.perf_counter()
+        cursor, tamano = flujo(client, cursor, rango or {})
+        tiempos.append(time.perf_counter() - inicio)
+        consultas.append(contador[0])
+        bytes_.append(tamano)
+    return statistics.median(tiempos) * 1000, statistics.median(consultas), statistics.median(bytes_)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alumnos', type=int, default=10000)
+    parser.add_argument('--pagos', type=int, default=1000000)
+    parser.add_argument('--paginas', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['ALUMNOS_DB_URL'] = f"sqlite:///{os.path.join(tmp, 'AlumnosTB.db')}"
+        os.chdir(RAIZ)
+        import database
+        from plan_consultas import sembrar
+        database.Base.metadata.create_all(database.engine)
+        sembrar(database.engine, args.alumnos, args.pagos, 1)
+
+        from sqlalchemy import event
+        from app import app
+        contador = [0]
+
+        @event.listens_for(database.engine, 'before_cursor_execute')
+        def contar(*_):
+            contador[0] += 1
+
+        client = app.test_client()
+        # El primer recorrido llena el cache de páginas de SQLite para que ambos flujos partan igual
+        medir(client, contador, estado_pagos, 1)
+        medir(client, contador, por_alumno, 1)
+        casos = {
+            'por alumno': medir(client, contador, por_alumno, args.paginas),
+            'estado de pagos': medir(client, contador, estado_pagos, args.paginas),
+            'estado de pagos, rango': medir(client, contador, estado_pagos, args.paginas,
+                                            {'desde': date.today().replace(month=1, day=1).isoformat()}),
+        }
+        database.engine.dispose()
+
+    print(f"{args.alumnos} alumnos, {args.pagos} pagos; mediana por página de 50 alumnos")
+    print(f"{'flujo':<26}{'ms':>10}{'consultas':>11}{'KB':>9}")
+    for nombre, (ms, consultas, tamano) in casos.items():
+        print(f"{nombre:<26}{ms:>10.1f}{consultas:>11.0f}{tamano / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
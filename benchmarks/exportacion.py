@@ -0,0 +1,110 @@
+"""Tiempo y memoria de las filas del reporte de pedidos según cómo se leen.
+
+Compara tres formas de producir las filas para el escritor:
+
+- pandas: lista de dicts desde objetos Pedido, DataFrame y `df.values`
+  (como se generaban los reportes originalmente; se omite sin pandas);
+- entidades: objetos Pedido con `yield_per` convertidos a tuplas;
+- columnas: sólo las columnas del reporte como tuplas, sin objetos del modelo.
+
+Uso: python benchmarks/exportacion.py [--pedidos N] [--repeticiones N] [--escribir]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+
+def filas_pandas(session):
+    import pandas as pd
+    from database import Pedido
+    datos = [{
+        'Fecha': p.fecha, 'Solicitante': p.nombre_solicitante, 'Producto': p.tipo_producto,
+        'Talla': p.talla, 'Color': p.color or 'N/A', 'Cantidad': p.cantidad
+    } for p in session.query(Pedido).all()]
+    return pd.DataFrame(datos).values
+
+
+def filas_entidades(session):
+    from database import Pedido
+    return ((p.fecha, p.nombre_solicitante, p.tipo_producto, p.talla, p.color or 'N/A', p.cantidad)
+            for p in session.query(Pedido).yield_per(500))
+
+
+def filas_columnas(session):
+    from app import COLUMNAS_REPORTE_PEDIDOS
+    return session.query(*COLUMNAS_REPORTE_PEDIDOS).yield_per(500)
+
+
+ESTRATEGIAS = {'pandas': filas_pandas, 'entidades': filas_entidades, 'columnas': filas_columnas}
+
+
+def consumir(filas):
+    for fila in filas:
+        tuple(fila)
+
+
+def escribir(filas):
+    from app import ENCABEZADOS_PEDIDOS, LOGO_PEDIDOS
+    from reportes import buffer_reporte, escribir_excel
+    with buffer_reporte() as buffer:
+        escribir_excel(buffer, 'Pedidos', ENCABEZADOS_PEDIDOS, filas, logo=LOGO_PEDIDOS)
+
+
+def medir(session_factory, estrategia, destino, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        session = session_factory()
+        inicio = time.perf_counter()
+        destino(estrategia(session))
+        tiempos.append(time.perf_counter() - inicio)
+        session.close()
+
+    session = session_factory()
+    tracemalloc.start()
+    destino(estrategia(session))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+    return statistics.median(tiempos) * 1000, pico / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pedidos', type=int, default=200000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--escribir', action='store_true', help='incluye escribir el libro de Excel')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['ALUMNOS_DB_URL'] = f"sqlite:///{os.path.join(tmp, 'AlumnosTB.db')}"
+        os.chdir(RAIZ)
+        import database
+        from plan_consultas import sembrar
+        database.Base.metadata.create_all(database.engine)
+        sembrar(database.engine, 100, 1, args.pedidos)
+
+        estrategias = dict(ESTRATEGIAS)
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            del estrategias['pandas']
+            print("pandas no está instalado; se omite esa estrategia\n")
+
+        destino = escribir if args.escribir else consumir
+        print(f"{args.pedidos} pedidos, {'filas y libro de Excel' if args.escribir else 'sólo filas'}")
+        print(f"{'estrategia':<12}{'mediana ms':>12}{'pico MB':>10}")
+        for nombre, estrategia in estrategias.items():
+            ms, mb = medir(database.Session, estrategia, destino, args.repeticiones)
+            print(f"{nombre:<12}{ms:>12.1f}{mb:>10.1f}")
+        database.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
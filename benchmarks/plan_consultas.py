@@ -0,0 +1,105 @@
+"""Plan de consultas y tiempos de las consultas frecuentes, sin y con índices.
+
+Genera una base SQLite temporal con datos sintéticos, mide cada consulta con
+los índices borrados y después de aplicar la migración.
+
+Uso: python benchmarks/plan_consultas.py [--alumnos N] [--pagos N] [--pedidos N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Base  # noqa: E402
+from migraciones import aplicar_indices  # noqa: E402
+
+HOY = date.today().isoformat()
+PRODUCTOS = ['espinillera', 'cabezal', 'antebracera', 'codera', 'peto', 'empeineras', 'guantillas', 'mica', 'uniforme']
+
+CONSULTAS = {
+    'pedidos de hoy': ("SELECT * FROM pedidos WHERE fecha = :hoy", {'hoy': HOY}),
+    'totales de hoy por producto': (
+        "SELECT tipo_producto, SUM(cantidad) FROM pedidos WHERE fecha = :hoy GROUP BY tipo_producto",
+        {'hoy': HOY}),
+    'página de pedidos': (
+        "SELECT * FROM pedidos WHERE (fecha, id) < (:hoy, 1000000000) ORDER BY fecha DESC, id DESC LIMIT 50",
+        {'hoy': HOY}),
+    'pagos de un alumno': ("SELECT * FROM pagos WHERE alumno_id = :id ORDER BY fecha", {'id': 42}),
+    'alumnos activos': ("SELECT * FROM alumnos WHERE estatus = 'activo'", {}),
+    'página de alumnos': (
+        "SELECT * FROM alumnos ORDER BY apaterno, apmaterno, nombre, id LIMIT 50", {}),
+}
+
+
+def sembrar(engine, n_alumnos, n_pagos, n_pedidos):
+    rnd = random.Random(0)
+    inicio = date.today() - timedelta(days=3 * 365)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO alumnos (apaterno, apmaterno, nombre, fbday, curp, calle, numero, colonia, "
+            "email, telefono, numafiliacion, estatus) VALUES (:ap, :am, :n, '2010-01-01', :curp, 'c', '1', "
+            "'col', 'a@b.mx', '555', :af, :est)"),
+            [{'ap': f'Ap{rnd.randrange(500)}', 'am': f'Am{rnd.randrange(500)}', 'n': f'N{i}',
+              'curp': f'{i:018d}', 'af': f'AF{i}', 'est': 'activo' if rnd.random() < 0.3 else 'inactivo'}
+             for i in range(n_alumnos)])
+        conn.execute(text(
+            "INSERT INTO pagos (alumno_id, fecha, monto, concepto) VALUES (:a, :f, 500.0, 'mensualidad')"),
+            [{'a': rnd.randrange(1, n_alumnos + 1), 'f': (inicio + timedelta(days=rnd.randrange(1095))).isoformat()}
+             for _ in range(n_pagos)])
+        conn.execute(text(
+            "INSERT INTO pedidos (fecha, nombre_solicitante, tipo_producto, talla, color, cantidad) "
+            "VALUES (:f, 'Solicitante', :p, 'MD', 'azul', :c)"),
+            [{'f': (inicio + timedelta(days=rnd.randrange(1096))).isoformat(), 'p': rnd.choice(PRODUCTOS),
+              'c': rnd.randrange(1, 5)} for _ in range(n_pedidos)])
+
+
+def medir(engine, repeticiones=20):
+    resultados = {}
+    with engine.connect() as conn:
+        for nombre, (sql, params) in CONSULTAS.items():
+            plan = [fila[-1] for fila in conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params)]
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                conn.execute(text(sql), params).fetchall()
+            resultados[nombre] = (plan, (time.perf_counter() - inicio) / repeticiones * 1000)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alumnos', type=int, default=10000)
+    parser.add_argument('--pagos', type=int, default=200000)
+    parser.add_argument('--pedidos', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.drop(bind=engine)
+        sembrar(engine, args.alumnos, args.pagos, args.pedidos)
+
+        antes = medir(engine)
+        creados = aplicar_indices(Base.metadata, engine)
+        despues = medir(engine)
+        engine.dispose()
+
+    print(f"Índices creados: {', '.join(creados)}\n")
+    for nombre in CONSULTAS:
+        plan_antes, ms_antes = antes[nombre]
+        plan_despues, ms_despues = despues[nombre]
+        print(f"== {nombre}: {ms_antes:.2f} ms -> {ms_despues:.2f} ms")
+        print(f"   antes:   {' | '.join(plan_antes)}")
+        print(f"   después: {' | '.join(plan_despues)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Rendimiento de las rutas y de los generadores de reportes contra una línea base.
+
+Siembra una base SQLite temporal con datos sintéticos, recorre todas las rutas
+de app.py con el cliente de pruebas de Flask y mide por separado los
+generadores de Excel y PDF. De cada caso registra peticiones por segundo,
+latencia p50/p99 y el pico de memoria asignada, y compara contra la línea
+base en JSON de una corrida anterior.
+
+Medir memoria con tracemalloc hace varias veces más lenta la ejecución
+adicional de cada caso; --sin-memoria sólo mide tiempos.
+
+Uso: python benchmarks/rendimiento.py [--alumnos N] [--pagos N] [--pedidos N]
+                                      [--base ARCHIVO] [--guardar] [--tolerancia 0.2]
+                                      [--sin-memoria]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+BASE_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linea_base_rendimiento.json')
+# Parámetros que deben coincidir para que la comparación con la línea base tenga sentido
+CONFIGURACION = ('alumnos', 'pagos', 'pedidos', 'repeticiones', 'repeticiones_reportes', 'filas_generadores')
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir(funcion, repeticiones, antes=None, memoria=True):
+    """Tiempos de `funcion(i)` y pico de memoria de una ejecución adicional."""
+    tiempos = []
+    for i in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if memoria:
+        if antes:
+            antes()
+        tracemalloc.start()
+        funcion(repeticiones)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'repeticiones': repeticiones,
+        'por_segundo': round(repeticiones / sum(tiempos), 2),
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 3),
+        'p99_ms': round(percentil(tiempos, 99) * 1000, 3),
+        'memoria_pico_kb': round(pico / 1024, 1) if pico is not None else None,
+    }
+
+
+def formulario_alumno(i, curp, afiliacion):
+    return {'apaterno': 'Bench', 'apmaterno': 'Marca', 'nombre': f'N{i}', 'fbday': '2012-05-01',
+            'curp': curp, 'calle': 'c', 'numero': '1', 'colonia': 'col', 'email': 'a@b.mx',
+            'telefono': '555', 'numafiliacion': afiliacion, 'estatus': 'activo'}
+
+
+def csv_importacion(filas=200):
+    from importacion import ENCABEZADOS
+    lineas = [','.join(ENCABEZADOS)]
+    for i in range(filas):
+        lineas.append(f'Imp,Marca,N{i},2011-03-04,IMP{i:015d},c,1,col,a@b.mx,555,IMP{i},activo')
+    return '\n'.join(lineas).encode('utf-8')
+
+
+def casos_rutas(client, n_alumnos, n_pedidos):
+    """(nombre, endpoint, función(i), es_reporte); las rutas que borran van al final."""
+    from trabajos import LISTO
+
+    producto = {'tipo': 'peto', 'talla': 'MD', 'color': 'azul', 'cantidad': 1}
+    lote = [{'nombre_solicitante': f'Lote{j}', 'productos': [producto, producto]} for j in range(50)]
+    importacion = csv_importacion()
+
+    def get(url):
+        return lambda i: client.get(url).get_data()
+
+    def reporte_en_cola(i):
+        respuesta = client.post('/reportes', json={'tipo': 'pedidos_hoy_excel'}).get_json()
+        while True:
+            estado = client.get(respuesta['estado_url']).get_json()
+            if estado['estado'] == LISTO:
+                return client.get(estado['descarga_url']).get_data()
+            if estado['estado'] == 'error':
+                raise RuntimeError(estado['error'])
+            time.sleep(0.005)
+
+    return [
+        ('inicio', 'index', get('/'), False),
+        ('formulario alumno', 'registro', get('/nuevo_alumno'), False),
+        ('registrar alumno', 'registro', lambda i: client.post(
+            '/nuevo_alumno', data=formulario_alumno(i, f'BENCH{i:013d}', f'BENCH{i}')).get_data(), False),
+        ('formulario pedido', 'ingresar_pedido', get('/captura_pedido'), False),
+        ('capturar pedido', 'ingresar_pedido', lambda i: client.post(
+            '/captura_pedido', json={'nombre_solicitante': f'Bench{i}', 'productos': [producto] * 3}).get_data(),
+         False),
+        ('capturar lote de 100', 'ingresar_pedidos_lote', lambda i: client.post(
+            '/captura_pedidos_lote', json=lote).get_data(), False),
+        ('pedidos de hoy', 'pedidos_hoy', get('/pedidos_hoy'), False),
+        ('lista de pedidos', 'pedidos', get('/pedidos'), False),
+        ('api pedidos', 'api_pedidos', get('/api/pedidos'), False),
+        ('lista de alumnos', 'lista_alumnos', get('/consulta_alumnos'), False),
+        ('api alumnos', 'api_alumnos', get('/api/alumnos'), False),
+        ('api estado de pagos', 'api_estado_pagos', get('/api/estado_pagos'), False),
+        ('api estado de pagos por rango', 'api_estado_pagos',
+         get(f'/api/estado_pagos?desde={date.today().replace(month=1, day=1)}'), False),
+        ('buscar alumnos', 'api_buscar_alumnos', get('/api/buscar_alumnos?q=ap1'), False),
+        ('detalle alumno', 'detalle_alumno', get('/actualizar_alumno/1'), False),
+        ('actualizar alumno', 'detalle_alumno', lambda i: client.post(
+            '/actualizar_alumno/1', data=formulario_alumno(0, f'{0:018d}', 'AF0')).get_data(), False),
+        ('formulario pago', 'pago', get('/registrar_nuevo_pago/1'), False),
+        ('registrar pago', 'pago', lambda i: client.post(
+            f'/registrar_nuevo_pago/{i % n_alumnos + 1}',
+            data={'fecha': date.today().isoformat(), 'monto': '500', 'concepto': 'mensualidad'}).get_data(), False),
+        ('pagos de un alumno', 'pagos', get('/consulta_de_pagos/1'), False),
+        ('api morosos', 'api_morosos', get('/api/morosos'), False),
+        ('api agregado pedidos', 'api_agregado_pedidos', get('/api/agregado_pedidos'), False),
+        ('importar 200 alumnos', 'importar_alumnos_archivo', lambda i: client.post(
+            '/importar_alumnos', data={'archivo': (io.BytesIO(importacion), 'alumnos.csv')},
+            content_type='multipart/form-data').get_data(), False),
+        ('exportar alumnos csv', 'exportar_alumnos', get('/exportar_alumnos'), False),
+        ('exportar alumnos xlsx', 'exportar_alumnos', get('/exportar_alumnos?formato=xlsx'), True),
+        ('reporte alumnos excel', 'generar_reporte', get('/generar_reporte'), True),
+        ('reporte alumnos pdf', 'generar_reporte_pdf', get('/generar_reporte_pdf'), True),
+        ('reporte pagos excel', 'generar_reporte_pagos', get('/generar_reporte_pagos/1'), True),
+        ('reporte pagos pdf', 'generar_reporte_pagos_pdf', get('/generar_reporte_pagos_pdf/1'), True),
+        ('reporte morosos excel', 'generar_reporte_morosos', get('/generar_reporte_morosos'), True),
+        ('reporte pedidos excel', 'generar_reporte_pedidos_excel', get('/generar_reporte_pedidos_excel'), True),
+        ('reporte pedidos hoy excel', 'generar_reporte_pedidos_hoy_excel',
+         get('/generar_reporte_pedidos_hoy_excel'), True),
+        ('reporte pedidos pdf', 'generar_reporte_pedidos_pdf', get('/generar_reporte_pedidos_pdf'), True),
+        ('reporte pedidos hoy pdf', 'generar_reporte_pedidos_hoy_pdf', get('/generar_reporte_pedidos_hoy_pdf'), True),
+        ('reporte agregado excel', 'generar_reporte_agregado_pedidos_excel',
+         get('/generar_reporte_agregado_pedidos_excel'), True),
+        ('reporte agregado pdf', 'generar_reporte_agregado_pedidos_pdf',
+         get('/generar_reporte_agregado_pedidos_pdf'), True),
+        ('reporte pedidos del día archivado', 'reporte_pedidos_dia', get('/reporte_pedidos_dia'), False),
+        ('reporte en segundo plano', ('iniciar_reporte', 'estado_reporte', 'descargar_reporte'),
+         reporte_en_cola, True),
+        ('métricas', 'exponer_metricas', get('/metrics'), False),
+        ('eliminar pedido', 'eliminar_pedido', lambda i: client.delete(
+            f'/eliminar_pedido/{n_pedidos - i}').get_data(), False),
+        ('eliminar alumno', 'eliminar_alumno', lambda i: client.post(
+            f'/eliminar_alumno/{n_alumnos - i}').get_data(), False),
+    ]
+
+
+def casos_generadores(n_filas):
+    """Los generadores de Excel y PDF con filas en memoria, sin base de datos ni Flask."""
+    from reportes import buffer_reporte, escribir_excel, escribir_pdf
+    from app import ENCABEZADOS_PEDIDOS, LOGO_PEDIDOS
+
+    hoy = date.today()
+    filas = [(hoy, f'Solicitante {i}', 'peto', 'MD', 'azul', i % 5 + 1) for i in range(n_filas)]
+
+    def excel(i):
+        with buffer_reporte() as buffer:
+            escribir_excel(buffer, 'Pedidos', ENCABEZADOS_PEDIDOS, filas, logo=LOGO_PEDIDOS)
+
+    def pdf(i):
+        with buffer_reporte() as buffer:
+            escribir_pdf(buffer, ENCABEZADOS_PEDIDOS, filas, titulo='Reporte de Pedidos', columnas_suma=[5])
+
+    return [(f'escribir_excel {n_filas} filas', excel), (f'escribir_pdf {n_filas} filas', pdf)]
+
+
+def comparar(resultados, base, tolerancia):
+    """Imprime la tabla de resultados; regresa los casos más lentos que la línea base."""
+    regresiones = []
+    print(f"{'caso':<42}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'pico KB':>11}  vs base p50")
+    for nombre, r in resultados.items():
+        anterior = (base or {}).get(nombre)
+        comparacion = ''
+        if anterior:
+            cambio = r['p50_ms'] / anterior['p50_ms'] - 1 if anterior['p50_ms'] else 0
+            comparacion = f'{cambio:+.0%}'
+            if cambio > tolerancia:
+                regresiones.append(nombre)
+                comparacion += '  REGRESIÓN'
+        pico = '-' if r['memoria_pico_kb'] is None else f"{r['memoria_pico_kb']:.0f}"
+        print(f"{nombre:<42}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['por_segundo']:>10.1f}"
+              f"{pico:>11}  {comparacion}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alumnos', type=int, default=10000)
+    parser.add_argument('--pagos', type=int, default=1000000)
+    parser.add_argument('--pedidos', type=int, default=500000)
+    parser.add_argument('--repeticiones', type=int, default=20, help='repeticiones de cada ruta')
+    parser.add_argument('--repeticiones-reportes', type=int, default=3,
+                        help='repeticiones de cada reporte completo y de los generadores')
+    parser.add_argument('--filas-generadores', type=int, default=20000,
+                        help='filas de los generadores de Excel y PDF medidos sin base de datos')
+    parser.add_argument('--sin-memoria', action='store_true', help='no mide el pico de memoria')
+    parser.add_argument('--base', default=BASE_DEFAULT, help='archivo JSON de la línea base')
+    parser.add_argument('--guardar', action='store_true', help='guarda esta corrida como la nueva línea base')
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help='aumento de p50 respecto a la línea base que cuenta como regresión')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # La base se elige por variable de entorno antes de importar la aplicación
+        os.environ['ALUMNOS_DB_URL'] = f"sqlite:///{os.path.join(tmp, 'AlumnosTB.db')}"
+        os.environ['ALUMNOS_ARCHIVO_REPORTES'] = os.path.join(tmp, 'archivo_reportes')
+        os.chdir(RAIZ)
+        import database
+        from plan_consultas import sembrar
+        database.Base.metadata.create_all(database.engine)
+        inicio = time.perf_counter()
+        sembrar(database.engine, args.alumnos, args.pagos, args.pedidos)
+        print(f"Base sembrada en {time.perf_counter() - inicio:.1f} s: {args.alumnos} alumnos, "
+              f"{args.pagos} pagos, {args.pedidos} pedidos\n")
+
+        # init_db e inicializar_agregados corren al importar la aplicación
+        from app import app
+        from cache_reportes import cache
+        client = app.test_client()
+
+        resultados = {}
+        cubiertas = set()
+        casos = casos_rutas(client, args.alumnos, args.pedidos)
+        for nombre, endpoint, funcion, es_reporte in casos:
+            cubiertas.update(endpoint if isinstance(endpoint, tuple) else (endpoint,))
+            # Los reportes se miden generándolos, no desde el cache
+            repeticiones = args.repeticiones_reportes if es_reporte else args.repeticiones
+            resultados[nombre] = medir(funcion, repeticiones, cache.limpiar if es_reporte else None,
+                                       memoria=not args.sin_memoria)
+        for nombre, funcion in casos_generadores(args.filas_generadores):
+            resultados[nombre] = medir(funcion, args.repeticiones_reportes, memoria=not args.sin_memoria)
+        database.engine.dispose()
+
+    faltantes = sorted({regla.endpoint for regla in app.url_map.iter_rules()} - cubiertas - {'static'})
+    if faltantes:
+        print(f"Rutas sin medir: {', '.join(faltantes)}\n")
+
+    configuracion = {clave: getattr(args, clave) for clave in CONFIGURACION}
+    base = None
+    if os.path.exists(args.base):
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        if base['configuracion'] != configuracion:
+            print("Aviso: la línea base se generó con otros tamaños o repeticiones\n")
+    regresiones = comparar(resultados, base and base['resultados'], args.tolerancia)
+    print(f"\nMemoria máxima del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if args.guardar:
+        with open(args.base, 'w', encoding='utf-8') as f:
+            json.dump({'fecha': date.today().isoformat(), 'python': platform.python_version(),
+                       'configuracion': configuracion, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.base}")
+    elif regresiones:
+        print(f"{len(regresiones)} casos más lentos que la línea base (tolerancia {args.tolerancia:.0%})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
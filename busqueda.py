@@ -0,0 +1,26 @@
+## Búsqueda de alumnos mientras se escribe (SQLite FTS5)
+import re
+
+from sqlalchemy import text
+
+MAX_RESULTADOS = 50
+
+# Letras (con o sin acento) y dígitos; el resto separa términos
+_TERMINO = re.compile(r'\w+', re.UNICODE)
+
+_CONSULTA = text(
+    "SELECT a.id, a.nombre, a.apaterno, a.apmaterno, a.curp, a.numafiliacion, a.telefono, a.estatus "
+    "FROM alumnos_fts JOIN alumnos a ON a.id = alumnos_fts.rowid "
+    "WHERE alumnos_fts MATCH :consulta ORDER BY rank LIMIT :limite")
+
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el usuario en una consulta FTS5 de prefijos: `nu gar` -> `"nu"* "gar"*`."""
+    return ' '.join(f'"{termino}"*' for termino in _TERMINO.findall(texto))
+
+
+def buscar_alumnos(session, texto, limite=MAX_RESULTADOS):
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    return session.execute(_CONSULTA, {'consulta': consulta, 'limite': limite}).mappings().all()
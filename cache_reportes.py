@@ -0,0 +1,52 @@
+## Cache de reportes generados (LRU con límite de tamaño)
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+MAX_BYTES_CACHE = 64 * 1024 * 1024
+MAX_BYTES_REPORTE = 16 * 1024 * 1024
+
+
+def clave_reporte(tipo, parametros, versiones):
+    """Clave del reporte: tipo, parámetros y versión de cada tabla que consulta."""
+    contenido = json.dumps([tipo, parametros, versiones], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+class CacheReportes:
+    def __init__(self, max_bytes=MAX_BYTES_CACHE, max_bytes_reporte=MAX_BYTES_REPORTE):
+        self.max_bytes = max_bytes
+        self.max_bytes_reporte = max_bytes_reporte
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                self._datos.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave, contenido, filename, mimetype):
+        if len(contenido) > self.max_bytes_reporte:
+            return False
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[0])
+            self._datos[clave] = (contenido, filename, mimetype)
+            self._bytes += len(contenido)
+            while self._bytes > self.max_bytes:
+                _, (viejo, _, _) = self._datos.popitem(last=False)
+                self._bytes -= len(viejo)
+        return True
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+
+cache = CacheReportes()
@@ -1,14 +1,273 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+## Capa de datos: modelos, engine configurable y sesión por petición
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import (create_engine, event, insert, Column, Integer, String, Date, DateTime, ForeignKey, Float, Index,
+                        Boolean, Text)
+from sqlalchemy.orm import scoped_session, sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 
-engine = create_engine('sqlite:///AlumnosTB.db')
-db_session = scoped_session(sessionmaker(autocommit=False,
-                                         autoflush=False,
-                                         bind=engine))
+from migraciones import aplicar_indices, crear_busqueda_alumnos
+from trabajos import MAX_TRABAJOS_CONCURRENTES
+
+logger = logging.getLogger(__name__)
+
+# Configuración por variables de entorno
+DATABASE_URL = os.environ.get('ALUMNOS_DB_URL', 'sqlite:///AlumnosTB.db')
+DB_ECHO = os.environ.get('ALUMNOS_DB_ECHO', '0') == '1'
+# Hilos por worker de gunicorn (gunicorn.conf.py)
+HILOS_SERVIDOR = int(os.environ.get('ALUMNOS_HILOS', '8'))
+# Conexiones por proceso: una por hilo del servidor y una por reporte en segundo plano;
+# el desborde cubre el archivo de reportes y las peticiones que llegan en ráfaga
+DB_POOL_SIZE = int(os.environ.get('ALUMNOS_DB_POOL_SIZE', HILOS_SERVIDOR + MAX_TRABAJOS_CONCURRENTES))
+DB_MAX_OVERFLOW = int(os.environ.get('ALUMNOS_DB_MAX_OVERFLOW', '5'))
+DB_POOL_TIMEOUT = int(os.environ.get('ALUMNOS_DB_POOL_TIMEOUT', '30'))
+
+# PRAGMAs de SQLite aplicados a cada conexión nueva
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',         # lectores y un escritor sin bloquearse entre sí
+    'synchronous': 'NORMAL',       # seguro con WAL y mucho menos fsync
+    'cache_size': -20000,          # 20 MB de cache de páginas
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,          # espera a otro escritor en lugar de fallar con "database is locked"
+}
+# SQLite admite un solo escritor; los que esperan reintentan con pausas crecientes (busy_timeout)
+# y con varios hilos escribiendo a la vez algunos tardan segundos. Con =1 se forman en un lock del
+# proceso: acota esas colas, pero el lock dura toda la transacción y sube la latencia de cada
+# escritura aun sin carga, por eso está apagado por defecto.
+SERIALIZAR_ESCRITURAS = os.environ.get('ALUMNOS_SERIALIZAR_ESCRITURAS', '0') == '1'
+SENTENCIAS_ESCRITURA = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def crear_engine(url=DATABASE_URL, echo=DB_ECHO):
+    opciones = {'echo': echo, 'pool_pre_ping': True}
+    es_sqlite = url.startswith('sqlite')
+    if es_sqlite:
+        opciones['connect_args'] = {'check_same_thread': False}
+    if not url.endswith(':memory:'):
+        opciones.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    nuevo = create_engine(url, **opciones)
+
+    if es_sqlite:
+        @event.listens_for(nuevo, 'connect')
+        def aplicar_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, valor in SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma}={valor}')
+            cursor.close()
+
+    if es_sqlite and SERIALIZAR_ESCRITURAS:
+        serializar_escrituras(nuevo)
+
+    return nuevo
+
+
+def serializar_escrituras(engine):
+    """Una transacción toma el lock en su primera escritura y lo suelta al terminar.
+
+    Sólo ordena a los hilos de este proceso; entre workers de gunicorn sigue
+    decidiendo el busy_timeout de SQLite. Si no obtiene el lock en ese mismo
+    tiempo, la escritura sigue sin él (así nunca se queda colgada) y se registra
+    un aviso, porque entonces el lock ya no está ordenando a los escritores.
+    """
+    lock = threading.Lock()
+    espera = SQLITE_PRAGMAS['busy_timeout'] / 1000
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def tomar(conn, cursor, statement, parameters, context, executemany):
+        if 'escritura' not in conn.info and statement.lstrip()[:7].upper().startswith(SENTENCIAS_ESCRITURA):
+            conn.info['escritura'] = lock.acquire(timeout=espera)
+            if not conn.info['escritura']:
+                logger.warning("Escritura sin el lock tras esperar %.1f s; hay transacciones largas", espera)
+
+    def soltar(info):
+        if info.pop('escritura', False):
+            lock.release()
+
+    @event.listens_for(engine, 'commit')
+    def al_confirmar(conn):
+        soltar(conn.info)
+
+    @event.listens_for(engine, 'rollback')
+    def al_revertir(conn):
+        soltar(conn.info)
+
+    # Una conexión que vuelve al pool sin commit ni rollback explícitos
+    @event.listens_for(engine, 'reset')
+    def al_devolver(dbapi_connection, connection_record, reset_state):
+        soltar(connection_record.info)
+
+
+engine = crear_engine()
+# Session para hilos propios (reportes en segundo plano); db_session para las rutas
+Session = sessionmaker(bind=engine)
+db_session = scoped_session(Session)
 Base = declarative_base()
 Base.query = db_session.query_property()
 
+class Alumno(Base):
+    __tablename__ = 'alumnos'
+    id = Column(Integer, primary_key=True)
+    apaterno = Column(String(50), nullable=False)
+    apmaterno = Column(String(50), nullable=False)
+    nombre = Column(String(50), nullable=False)
+    fbday = Column(Date, nullable=False)
+    curp = Column(String(18), unique=True, nullable=False)
+    calle = Column(String(100), nullable=True)
+    numero = Column(String(10), nullable=False)
+    colonia = Column(String(100), nullable=False)
+    email = Column(String(100), nullable=False)
+    telefono = Column(String(15), nullable=False)
+    numafiliacion = Column(String(20), unique=True, nullable=True)
+    estatus = Column(String(10), nullable=False, index=True)
+    pagos = relationship("Pago", back_populates="alumno")
+
+    __table_args__ = (
+        Index('ix_alumnos_nombre_completo', 'apaterno', 'apmaterno', 'nombre'),
+    )
+
+class Pago(Base):
+    __tablename__ = 'pagos'
+    id = Column(Integer, primary_key=True)
+    alumno_id = Column(Integer, ForeignKey('alumnos.id'))
+    fecha = Column(Date, nullable=False)
+    monto = Column(Float, nullable=False)
+    concepto = Column(String(100), nullable=False)
+    alumno = relationship("Alumno", back_populates="pagos")
+
+    __table_args__ = (
+        Index('ix_pagos_alumno_fecha', 'alumno_id', 'fecha'),
+    )
+
+class Pedido(Base):
+    __tablename__ = 'pedidos'
+    id = Column(Integer, primary_key=True)
+    fecha = Column(Date, nullable=False)
+    nombre_solicitante = Column(String(100), nullable=False)
+    tipo_producto = Column(String(50), nullable=False)
+    talla = Column(String(10), nullable=False)
+    color = Column(String(50))
+    cantidad = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # fecha = hoy y paginación por (fecha, id); el rowid va implícito en el índice
+        Index('ix_pedidos_fecha', 'fecha'),
+        Index('ix_pedidos_fecha_tipo_producto', 'fecha', 'tipo_producto'),
+    )
+
+class ContadorCambios(Base):
+    __tablename__ = 'contadores_cambios'
+    tabla = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class CambioPedido(Base):
+    # Altas y bajas de pedidos del día, para que la pantalla de captura sólo pida lo nuevo.
+    # AUTOINCREMENT: una versión nunca se repite aunque se borre la última fila
+    __tablename__ = 'cambios_pedidos'
+    version = Column(Integer, primary_key=True)
+    pedido_id = Column(Integer, nullable=False)
+    fecha = Column(Date, nullable=False)
+    eliminado = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index('ix_cambios_pedidos_fecha_version', 'fecha', 'version'),
+        {'sqlite_autoincrement': True},
+    )
+
+class Evento(Base):
+    # Registro de solo alta de los cambios en pedidos, pagos y alumnos, escrito en la misma
+    # transacción que cada cambio. AUTOINCREMENT: el id es el orden en que ocurrieron
+    __tablename__ = 'eventos'
+    id = Column(Integer, primary_key=True)
+    registrado = Column(DateTime, nullable=False)
+    tipo = Column(String(30), nullable=False)
+    entidad_id = Column(Integer, nullable=True)
+    fecha = Column(Date, nullable=True)  # fecha del pedido o del pago
+    datos = Column(Text, nullable=False)  # JSON
+
+    __table_args__ = (
+        Index('ix_eventos_fecha', 'fecha'),
+        {'sqlite_autoincrement': True},
+    )
+
+# Tipos de evento
+PEDIDO_CREADO = 'pedido_creado'
+PEDIDO_ELIMINADO = 'pedido_eliminado'
+PAGO_REGISTRADO = 'pago_registrado'
+ALUMNO_CREADO = 'alumno_creado'
+ALUMNO_ACTUALIZADO = 'alumno_actualizado'
+ALUMNO_ELIMINADO = 'alumno_eliminado'
+# Los que deja la compactación en lugar de los eventos que resume (ver eventos.py)
+RESUMEN_PEDIDOS = 'resumen_pedidos'
+SALDO_ALUMNO = 'saldo_alumno'
+COMPACTACION = 'compactacion'
+
+class ResumenPedidos(Base):
+    # Totales por día y producto; se actualiza en la misma transacción que los pedidos
+    __tablename__ = 'resumen_pedidos'
+    fecha = Column(Date, primary_key=True)
+    tipo_producto = Column(String(50), primary_key=True)
+    talla = Column(String(10), primary_key=True)
+    color = Column(String(50), primary_key=True)  # '' cuando el producto no lleva color
+    cantidad = Column(Integer, nullable=False, default=0)
+    lineas = Column(Integer, nullable=False, default=0)
+
+class SaldoAlumno(Base):
+    # Resumen de pagos por alumno; se actualiza en la misma transacción que cada pago
+    __tablename__ = 'saldos_alumnos'
+    alumno_id = Column(Integer, ForeignKey('alumnos.id'), primary_key=True)
+    total_pagado = Column(Float, nullable=False, default=0)
+    num_pagos = Column(Integer, nullable=False, default=0)
+    ultimo_pago = Column(Date, nullable=True, index=True)
+    meses_cubiertos = Column(Integer, nullable=False, default=0)
+
+TABLAS_CON_CONTADOR = ['alumnos', 'pagos', 'pedidos']
+
+
+def marcar_cambio(session, *tablas):
+    # Se ejecuta en la misma transacción que el cambio; invalida los reportes en cache
+    session.query(ContadorCambios).filter(ContadorCambios.tabla.in_(tablas)).update(
+        {ContadorCambios.version: ContadorCambios.version + 1}, synchronize_session=False)
+
+
+def registrar_cambios_pedidos(session, fecha, pedido_ids, eliminado=False):
+    # Sólo se sincronizan los pedidos del día; el registro de días anteriores se descarta
+    hoy = date.today()
+    session.query(CambioPedido).filter(CambioPedido.fecha < hoy).delete(synchronize_session=False)
+    if fecha == hoy and pedido_ids:
+        session.execute(insert(CambioPedido), [
+            {'pedido_id': pedido_id, 'fecha': fecha, 'eliminado': eliminado} for pedido_id in pedido_ids])
+
+
+def registrar_eventos(session, tipo, eventos):
+    """Agrega eventos al registro dentro de la transacción de `session`.
+
+    `eventos` son tuplas (entidad_id, fecha, datos); `datos` se guarda como
+    JSON y las fechas que traiga como texto ISO.
+    """
+    ahora = datetime.now()
+    filas = [{'registrado': ahora, 'tipo': tipo, 'entidad_id': entidad_id, 'fecha': fecha,
+              'datos': json.dumps(datos, separators=(',', ':'), ensure_ascii=False, default=str)}
+             for entidad_id, fecha, datos in eventos]
+    if filas:
+        session.execute(insert(Evento), filas)
+
+
 def init_db():
-    import models # type: ignore
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    aplicar_indices(Base.metadata, engine)
+    crear_busqueda_alumnos(engine)
+
+    session = Session()
+    try:
+        existentes = {c.tabla for c in session.query(ContadorCambios)}
+        for tabla in TABLAS_CON_CONTADOR:
+            if tabla not in existentes:
+                session.add(ContadorCambios(tabla=tabla, version=0))
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,222 @@
+## Registro de eventos: datos de cada evento, reproducción para reconstruir los resúmenes y compactación
+import json
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from database import (ALUMNO_CREADO, ALUMNO_ELIMINADO, COMPACTACION, PAGO_REGISTRADO, PEDIDO_CREADO,
+                      PEDIDO_ELIMINADO, RESUMEN_PEDIDOS, SALDO_ALUMNO, Alumno, Evento, Pago, Pedido,
+                      ResumenPedidos, SaldoAlumno, Session, marcar_cambio, registrar_eventos)
+
+# Eventos que se leen y filas que se escriben por bloque; la memoria no crece con el registro
+TAMANO_LOTE_EVENTOS = 50000
+
+CAMPOS_PEDIDO = ('nombre_solicitante', 'tipo_producto', 'talla', 'color', 'cantidad')
+CAMPOS_ALUMNO = ('apaterno', 'apmaterno', 'nombre', 'fbday', 'curp', 'calle', 'numero', 'colonia', 'email',
+                 'telefono', 'numafiliacion', 'estatus')
+# Los eventos que cambian los resúmenes; la compactación reemplaza todos menos las bajas de alumnos
+TIPOS_REPRODUCIBLES = (PEDIDO_CREADO, PEDIDO_ELIMINADO, PAGO_REGISTRADO, ALUMNO_ELIMINADO, RESUMEN_PEDIDOS,
+                       SALDO_ALUMNO)
+TIPOS_COMPACTABLES = (PEDIDO_CREADO, PEDIDO_ELIMINADO, PAGO_REGISTRADO, RESUMEN_PEDIDOS, SALDO_ALUMNO)
+
+
+def _valor(registro, campo):
+    return registro[campo] if isinstance(registro, dict) else getattr(registro, campo)
+
+
+def datos_pedido(pedido):
+    """Campos de un pedido (objeto o dict) que guarda su evento."""
+    return {campo: _valor(pedido, campo) for campo in CAMPOS_PEDIDO}
+
+
+def datos_alumno(alumno):
+    return {campo: _valor(alumno, campo) for campo in CAMPOS_ALUMNO}
+
+
+def cambios_alumno(antes, despues):
+    """{campo: [antes, después]} de los campos que cambiaron."""
+    return {campo: [antes[campo], despues[campo]] for campo in CAMPOS_ALUMNO if antes[campo] != despues[campo]}
+
+
+def ultima_compactacion(session):
+    """Id del último evento que ya está resumido por una compactación (0 si nunca se compactó)."""
+    return session.query(func.max(Evento.entidad_id)).filter(Evento.tipo == COMPACTACION).scalar() or 0
+
+
+def reproducir(session, hasta=None, lote=TAMANO_LOTE_EVENTOS):
+    """Recorre el registro una sola vez en orden y acumula los resúmenes.
+
+    Regresa (pedidos, saldos, eventos):
+      pedidos: {(fecha, tipo_producto, talla, color): [cantidad, lineas]}
+      saldos:  {alumno_id: [total_pagado, num_pagos, ultimo_pago, {'AAAA-MM', ...}]}
+    """
+    compactado = ultima_compactacion(session)
+    pedidos, saldos = {}, {}
+    eventos = 0
+    query = (session.query(Evento.id, Evento.tipo, Evento.entidad_id, Evento.fecha, Evento.datos)
+             .filter(Evento.tipo.in_(TIPOS_REPRODUCIBLES))
+             .order_by(Evento.id))
+    if hasta is not None:
+        query = query.filter(Evento.id <= hasta)
+
+    for evento_id, tipo, entidad_id, fecha, datos in query.yield_per(lote):
+        eventos += 1
+        if tipo == ALUMNO_ELIMINADO:
+            # Las bajas anteriores a la última compactación ya están aplicadas en sus saldos
+            if evento_id > compactado:
+                saldos.pop(entidad_id, None)
+            continue
+        d = json.loads(datos)
+        if tipo in (PEDIDO_CREADO, PEDIDO_ELIMINADO):
+            signo = 1 if tipo == PEDIDO_CREADO else -1
+            total = pedidos.setdefault((fecha, d['tipo_producto'], d['talla'], d['color'] or ''), [0, 0])
+            total[0] += signo * d['cantidad']
+            total[1] += signo
+        elif tipo == RESUMEN_PEDIDOS:
+            total = pedidos.setdefault((fecha, d['tipo_producto'], d['talla'], d['color']), [0, 0])
+            total[0] += d['cantidad']
+            total[1] += d['lineas']
+        elif tipo == PAGO_REGISTRADO:
+            saldo = saldos.setdefault(d['alumno_id'], [0, 0, None, set()])
+            saldo[0] += d['monto']
+            saldo[1] += 1
+            saldo[2] = fecha if saldo[2] is None else max(saldo[2], fecha)
+            saldo[3].add(f'{fecha:%Y-%m}')
+        elif tipo == SALDO_ALUMNO:
+            saldo = saldos.setdefault(entidad_id, [0, 0, None, set()])
+            saldo[0] += d['total_pagado']
+            saldo[1] += d['num_pagos']
+            saldo[2] = fecha if saldo[2] is None else max(saldo[2], fecha)
+            saldo[3].update(d['meses'])
+
+    pedidos = {llave: total for llave, total in pedidos.items() if total[1] > 0}
+    return pedidos, saldos, eventos
+
+
+def _en_lotes(filas, lote):
+    filas = list(filas)
+    for inicio in range(0, len(filas), lote):
+        yield filas[inicio:inicio + lote]
+
+
+def reconstruir_resumenes(session, lote=TAMANO_LOTE_EVENTOS):
+    """Reemplaza resumen_pedidos y saldos_alumnos con lo que resulta del registro.
+
+    Todo en la transacción de `session`; quien llama hace commit. Regresa el
+    número de eventos leídos.
+    """
+    pedidos, saldos, eventos = reproducir(session, lote=lote)
+    session.execute(delete(ResumenPedidos))
+    for bloque in _en_lotes(pedidos.items(), lote):
+        session.execute(insert(ResumenPedidos), [
+            {'fecha': fecha, 'tipo_producto': tipo, 'talla': talla, 'color': color,
+             'cantidad': cantidad, 'lineas': lineas}
+            for (fecha, tipo, talla, color), (cantidad, lineas) in bloque])
+    session.execute(delete(SaldoAlumno))
+    for bloque in _en_lotes(saldos.items(), lote):
+        session.execute(insert(SaldoAlumno), [
+            {'alumno_id': alumno_id, 'total_pagado': total, 'num_pagos': num, 'ultimo_pago': ultimo,
+             'meses_cubiertos': len(meses)}
+            for alumno_id, (total, num, ultimo, meses) in bloque])
+    marcar_cambio(session, 'pedidos', 'pagos')
+    return eventos
+
+
+def diferencias_resumenes(session, lote=TAMANO_LOTE_EVENTOS):
+    """Filas de los resúmenes actuales que no coinciden con el registro, sin escribir nada."""
+    pedidos, saldos, _ = reproducir(session, lote=lote)
+    diferentes = []
+    actuales = {(r.fecha, r.tipo_producto, r.talla, r.color): [r.cantidad, r.lineas]
+                for r in session.query(ResumenPedidos).yield_per(lote)}
+    for llave in actuales.keys() | pedidos.keys():
+        if actuales.get(llave) != pedidos.get(llave):
+            diferentes.append(('resumen_pedidos', llave, actuales.get(llave), pedidos.get(llave)))
+    actuales = {s.alumno_id: (s.total_pagado, s.num_pagos, s.ultimo_pago, s.meses_cubiertos)
+                for s in session.query(SaldoAlumno).yield_per(lote)}
+    esperados = {alumno_id: (total, num, ultimo, len(meses))
+                 for alumno_id, (total, num, ultimo, meses) in saldos.items()}
+    for alumno_id in actuales.keys() | esperados.keys():
+        actual, esperado = actuales.get(alumno_id), esperados.get(alumno_id)
+        if actual is None or esperado is None or abs(actual[0] - esperado[0]) > 0.005 or actual[1:] != esperado[1:]:
+            diferentes.append(('saldos_alumnos', alumno_id, actual, esperado))
+    return diferentes
+
+
+def compactar(session, antes_de, lote=TAMANO_LOTE_EVENTOS):
+    """Reemplaza los eventos registrados antes de `antes_de` por totales diarios y saldos.
+
+    Los resúmenes que resultan de reproducir el registro no cambian, pero el
+    detalle de los pedidos y pagos compactados se pierde (sólo quedan los
+    totales por día y producto y el saldo por alumno). Los eventos de alumnos
+    se conservan. Los eventos de resumen toman los ids más bajos de los
+    borrados, así que se siguen leyendo antes que todo lo posterior.
+    Regresa (eventos borrados, eventos de resumen escritos).
+    """
+    corte = session.query(func.max(Evento.id)).filter(Evento.registrado < antes_de).scalar()
+    if corte is None or corte <= ultima_compactacion(session):
+        return 0, 0
+    pedidos, saldos, _ = reproducir(session, hasta=corte, lote=lote)
+
+    resumenes = [(RESUMEN_PEDIDOS, None, fecha,
+                  {'tipo_producto': tipo, 'talla': talla, 'color': color, 'cantidad': cantidad, 'lineas': lineas})
+                 for (fecha, tipo, talla, color), (cantidad, lineas) in pedidos.items()]
+    resumenes += [(SALDO_ALUMNO, alumno_id, ultimo,
+                   {'total_pagado': total, 'num_pagos': num, 'meses': sorted(meses)})
+                  for alumno_id, (total, num, ultimo, meses) in saldos.items()]
+    compactables = (Evento.id <= corte, Evento.tipo.in_(TIPOS_COMPACTABLES))
+    ids = session.scalars(select(Evento.id).where(*compactables).order_by(Evento.id).limit(len(resumenes))).all()
+    borrados = session.execute(delete(Evento).where(*compactables)).rowcount
+
+    ahora = datetime.now()
+    filas = ({'id': evento_id, 'registrado': ahora, 'tipo': tipo, 'entidad_id': entidad_id, 'fecha': fecha,
+              'datos': json.dumps(datos, separators=(',', ':'), ensure_ascii=False)}
+             for evento_id, (tipo, entidad_id, fecha, datos) in zip(ids, resumenes))
+    for bloque in _en_lotes(filas, lote):
+        session.execute(insert(Evento), bloque)
+    registrar_eventos(session, COMPACTACION, [(corte, None, {'borrados': borrados, 'resumenes': len(resumenes)})])
+    return borrados, len(resumenes)
+
+
+def pedidos_de_fecha(session, fecha):
+    """Pedidos registrados para `fecha` según el registro, incluidos los que se eliminaron después.
+
+    Regresa dicts con `id`, los campos del pedido y `eliminado` (fecha y hora
+    de la baja o None). Usa ix_eventos_fecha; en días ya compactados sólo
+    quedan los totales.
+    """
+    pedidos = {}
+    for tipo, pedido_id, registrado, datos in (
+            session.query(Evento.tipo, Evento.entidad_id, Evento.registrado, Evento.datos)
+            .filter(Evento.fecha == fecha, Evento.tipo.in_((PEDIDO_CREADO, PEDIDO_ELIMINADO)))
+            .order_by(Evento.id)):
+        if tipo == PEDIDO_CREADO:
+            pedidos[pedido_id] = dict(json.loads(datos), id=pedido_id, eliminado=None)
+        elif pedido_id in pedidos:
+            pedidos[pedido_id]['eliminado'] = registrado
+    return list(pedidos.values())
+
+
+def iniciar_registro():
+    """Bases existentes: el registro empieza con un alta por cada alumno, pago y pedido actual."""
+    session = Session()
+    try:
+        if session.query(Evento.id).first() is not None:
+            return
+        ahora = literal(datetime.now(), Evento.registrado.type)
+        columnas = ['registrado', 'tipo', 'entidad_id', 'fecha', 'datos']
+        session.execute(insert(Evento).from_select(columnas, select(
+            ahora, literal(ALUMNO_CREADO), Alumno.id, literal(None, Evento.fecha.type),
+            func.json_object(*[x for campo in CAMPOS_ALUMNO for x in (campo, getattr(Alumno, campo))]))
+            .order_by(Alumno.id)))
+        session.execute(insert(Evento).from_select(columnas, select(
+            ahora, literal(PAGO_REGISTRADO), Pago.id, Pago.fecha,
+            func.json_object('alumno_id', Pago.alumno_id, 'monto', Pago.monto, 'concepto', Pago.concepto))
+            .where(Pago.alumno_id.isnot(None))
+            .order_by(Pago.id)))
+        session.execute(insert(Evento).from_select(columnas, select(
+            ahora, literal(PEDIDO_CREADO), Pedido.id, Pedido.fecha,
+            func.json_object(*[x for campo in CAMPOS_PEDIDO for x in (campo, getattr(Pedido, campo))]))
+            .order_by(Pedido.id)))
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,26 @@
+## Servidor de producción: gunicorn con workers gthread
+##   gunicorn app:app            (lee este archivo desde el directorio actual)
+# Se lee en el proceso maestro: sólo variables de entorno, sin importar la aplicación
+import os
+
+bind = os.environ.get('ALUMNOS_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+# Un solo proceso por defecto: la cola de reportes, su cache y /metrics viven en memoria del
+# proceso, así que con más workers el estado de un reporte puede consultarse en otro que no lo tiene
+workers = int(os.environ.get('ALUMNOS_WORKERS', '1'))
+# Cada hilo atiende una petición; database.py dimensiona el pool con el mismo ALUMNOS_HILOS
+threads = int(os.environ.get('ALUMNOS_HILOS', '8'))
+# Los reportes grandes van a la cola, pero los síncronos pueden tardar
+timeout = int(os.environ.get('ALUMNOS_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+# ALUMNOS_PRECARGAR_REPORTES=1 carga las librerías de reportes en el maestro (ver reportes.precargar)
+preload_app = os.environ.get('ALUMNOS_PRECARGAR_REPORTES', '0') == '1'
+# Vacío para no escribir el log de accesos
+accesslog = os.environ.get('ALUMNOS_ACCESS_LOG', '-') or None
+
+
+def post_fork(server, worker):
+    # Con preload el engine se creó en el maestro: cada worker abre sus propias conexiones
+    from database import engine
+    engine.dispose(close=False)
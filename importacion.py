@@ -0,0 +1,218 @@
+## Importación y exportación masiva de alumnos (CSV / XLSX)
+import csv
+import io
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy import insert, update
+
+from database import ALUMNO_ACTUALIZADO, ALUMNO_CREADO, Alumno, marcar_cambio, registrar_eventos
+from eventos import cambios_alumno, datos_alumno
+
+# Campo del modelo -> encabezado en el archivo; la exportación usa el mismo orden
+COLUMNAS_ALUMNOS = [
+    ('apaterno', 'Apellido Paterno'),
+    ('apmaterno', 'Apellido Materno'),
+    ('nombre', 'Nombre'),
+    ('fbday', 'Fecha de Nacimiento'),
+    ('curp', 'CURP'),
+    ('calle', 'Calle'),
+    ('numero', 'Número'),
+    ('colonia', 'Colonia'),
+    ('email', 'Email'),
+    ('telefono', 'Teléfono'),
+    ('numafiliacion', 'Número de Afiliación'),
+    ('estatus', 'Estatus'),
+]
+CAMPOS = [campo for campo, _ in COLUMNAS_ALUMNOS]
+ENCABEZADOS = [encabezado for _, encabezado in COLUMNAS_ALUMNOS]
+
+TAMANO_LOTE = 500
+# Errores que se regresan en detalle; el total se cuenta siempre
+MAX_ERRORES = 1000
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+FILAS_ANTES_DE_ENCABEZADOS = 10
+
+
+def _campo_de_encabezado(encabezado):
+    texto = str(encabezado or '').strip().lower()
+    for campo, etiqueta in COLUMNAS_ALUMNOS:
+        if texto in (campo, etiqueta.lower()):
+            return campo
+    return None
+
+
+def _registros(filas):
+    """Convierte filas en pares (número de fila, dict campo -> valor) a partir de los encabezados.
+
+    Se saltan las filas previas a los encabezados (el logo en los XLSX que
+    genera la exportación) y las filas vacías. El número es el de la fila en
+    el archivo, el que ve quien lo abre: en esos XLSX los datos empiezan en la 7.
+    """
+    filas = enumerate(filas, start=1)
+    encabezados = []
+    for _, fila in islice(filas, FILAS_ANTES_DE_ENCABEZADOS + 1):
+        encabezados = [_campo_de_encabezado(h) for h in fila]
+        if any(encabezados):
+            break
+    faltantes = [c for c in CAMPOS if c not in encabezados and not Alumno.__table__.c[c].nullable]
+    if faltantes:
+        raise ValueError(f"Faltan columnas: {', '.join(faltantes)}")
+    for numero, fila in filas:
+        if all(valor is None or str(valor).strip() == '' for valor in fila):
+            continue
+        yield numero, {campo: valor for campo, valor in zip(encabezados, fila) if campo}
+
+
+def leer_csv(archivo):
+    return _registros(csv.reader(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')))
+
+
+def leer_xlsx(archivo):
+    from openpyxl import load_workbook
+    wb = load_workbook(archivo, read_only=True, data_only=True)
+    return _registros(wb.active.iter_rows(values_only=True))
+
+
+def leer_archivo(archivo, nombre):
+    return leer_xlsx(archivo) if nombre.lower().endswith('.xlsx') else leer_csv(archivo)
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(str(valor).strip(), formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"fecha no válida: {valor}")
+
+
+def validar_alumno(registro):
+    """Aplica las reglas del modelo Alumno a un registro leído del archivo."""
+    alumno = {}
+    for campo in CAMPOS:
+        columna = Alumno.__table__.c[campo]
+        valor = registro.get(campo)
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor in (None, ''):
+            if not columna.nullable:
+                raise ValueError(f"{campo} es obligatorio")
+            alumno[campo] = None
+            continue
+        if campo == 'fbday':
+            valor = _fecha(valor)
+        else:
+            valor = str(valor)
+            if len(valor) > columna.type.length:
+                raise ValueError(f"{campo} excede {columna.type.length} caracteres")
+        alumno[campo] = valor
+    alumno['curp'] = alumno['curp'].upper()
+    if len(alumno['curp']) != 18:
+        raise ValueError("la CURP debe tener 18 caracteres")
+    return alumno
+
+
+def _guardar_lote(session, lote, resultado):
+    """Inserta o actualiza (por CURP) un lote validado en una sola transacción."""
+    curps = [a['curp'] for _, a in lote]
+    afiliaciones = [a['numafiliacion'] for _, a in lote if a['numafiliacion']]
+    existentes = {a.curp: a for a in session.query(Alumno).filter(Alumno.curp.in_(curps))}
+    duenos = dict(session.query(Alumno.numafiliacion, Alumno.curp).filter(Alumno.numafiliacion.in_(afiliaciones)))
+
+    nuevos, cambios = [], []
+    for numero, alumno in lote:
+        dueno = duenos.get(alumno['numafiliacion'])
+        if dueno is not None and dueno != alumno['curp']:
+            agregar_error(resultado, numero, f"numafiliacion {alumno['numafiliacion']} ya pertenece a {dueno}")
+            continue
+        if alumno['curp'] in existentes:
+            cambios.append(dict(alumno, id=existentes[alumno['curp']].id))
+        else:
+            nuevos.append(alumno)
+
+    # Los valores anteriores para el registro de eventos, antes de que el UPDATE los reemplace
+    eventos_cambios = []
+    for alumno in cambios:
+        diferencias = cambios_alumno(datos_alumno(existentes[alumno['curp']]), alumno)
+        if diferencias:
+            eventos_cambios.append((alumno['id'], None, diferencias))
+    if nuevos:
+        # Sin sort_by_parameter_order: sigue siendo un solo INSERT; los ids salen en el orden de `nuevos`
+        ids = sorted(session.scalars(insert(Alumno).returning(Alumno.id), nuevos))
+        registrar_eventos(session, ALUMNO_CREADO, [(i, None, datos_alumno(a)) for i, a in zip(ids, nuevos)])
+    if cambios:
+        session.execute(update(Alumno), cambios)
+        registrar_eventos(session, ALUMNO_ACTUALIZADO, eventos_cambios)
+    if nuevos or cambios:
+        marcar_cambio(session, 'alumnos')
+    session.commit()
+    resultado['insertados'] += len(nuevos)
+    resultado['actualizados'] += len(cambios)
+
+
+def agregar_error(resultado, numero, mensaje):
+    resultado['total_errores'] += 1
+    if len(resultado['errores']) < MAX_ERRORES:
+        resultado['errores'].append({"fila": numero, "error": mensaje})
+
+
+def importar_alumnos(session, registros, tamano_lote=TAMANO_LOTE):
+    """Valida y guarda los registros en lotes.
+
+    Sólo se tiene en memoria un lote de filas a la vez; lo que crece con el
+    archivo son los conjuntos de CURP y números de afiliación ya vistos.
+    """
+    resultado = {'insertados': 0, 'actualizados': 0, 'total_errores': 0, 'errores': []}
+    # Con ellos un repetido se reporta como error aunque su primera aparición ya se haya
+    # guardado en un lote anterior; contra la base se tomaría como actualización
+    vistos_curp, vistos_afiliacion = set(), set()
+    # `registros` trae pares (número de fila en el archivo, registro); ver _registros
+    registros = iter(registros)
+    while True:
+        crudos = list(islice(registros, tamano_lote))
+        if not crudos:
+            break
+        lote = []
+        for numero, registro in crudos:
+            try:
+                alumno = validar_alumno(registro)
+            except (ValueError, TypeError) as e:
+                agregar_error(resultado, numero, str(e))
+                continue
+            if alumno['curp'] in vistos_curp:
+                agregar_error(resultado, numero, f"CURP {alumno['curp']} repetida en el archivo")
+                continue
+            if alumno['numafiliacion'] and alumno['numafiliacion'] in vistos_afiliacion:
+                agregar_error(resultado, numero, f"numafiliacion {alumno['numafiliacion']} repetido en el archivo")
+                continue
+            vistos_curp.add(alumno['curp'])
+            if alumno['numafiliacion']:
+                vistos_afiliacion.add(alumno['numafiliacion'])
+            lote.append((numero, alumno))
+        if lote:
+            _guardar_lote(session, lote, resultado)
+    return resultado
+
+
+def filas_exportacion(session):
+    query = session.query(*(getattr(Alumno, campo) for campo in CAMPOS)).order_by(Alumno.id)
+    return query.yield_per(TAMANO_LOTE)
+
+
+def exportar_csv(session):
+    """Genera el CSV por partes, con los mismos encabezados que acepta la importación."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(ENCABEZADOS)
+    for i, fila in enumerate(filas_exportacion(session), start=1):
+        escritor.writerow(fila)
+        if i % TAMANO_LOTE == 0:
+            yield salida.getvalue()
+            salida.seek(0)
+            salida.truncate()
+    yield salida.getvalue()
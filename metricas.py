@@ -0,0 +1,204 @@
+## Métricas de la aplicación: latencia por ruta, SQL por petición y tiempos de reportes
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Milisegundos a partir de los cuales se registra una petición lenta; 0 la desactiva
+UMBRAL_LENTO_MS = float(os.environ.get('ALUMNOS_METRICAS_LENTO_MS', '0'))
+# Veces que la misma sentencia puede repetirse en una petición antes de marcarla como N+1
+UMBRAL_N_MAS_1 = int(os.environ.get('ALUMNOS_METRICAS_N_MAS_1', '10'))
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histograma:
+    """Histograma acumulado por etiquetas, con los buckets de Prometheus."""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0, 0.0]
+            conteos = serie[0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    conteos[i] += 1
+            serie[1] += 1
+            serie[2] += valor
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in sorted(self._series.items())]
+        for etiquetas, conteos, total, suma in series:
+            base = _etiquetas(self.etiquetas, etiquetas)
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f'{self.nombre}_bucket{{{base}le="{limite}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{{base}le="+Inf"}} {total}')
+            lineas.append(f'{self.nombre}_sum{_llaves(base)} {suma}')
+            lineas.append(f'{self.nombre}_count{_llaves(base)} {total}')
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = Counter()
+        self._lock = threading.Lock()
+
+    def incrementar(self, *etiquetas, valor=1):
+        with self._lock:
+            self._valores[etiquetas] += valor
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for etiquetas, valor in valores:
+            lineas.append(f'{self.nombre}{_llaves(_etiquetas(self.etiquetas, etiquetas))} {valor}')
+        return lineas
+
+
+def _etiquetas(nombres, valores):
+    return ''.join(f'{n}="{_escapar(v)}",' for n, v in zip(nombres, valores))
+
+
+def _llaves(etiquetas):
+    etiquetas = etiquetas.rstrip(',')
+    return f'{{{etiquetas}}}' if etiquetas else ''
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PeticionActual:
+    """Lo que se mide de la petición en curso en este hilo."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.sentencias = Counter()
+
+
+class Metricas:
+    def __init__(self, umbral_lento_ms=UMBRAL_LENTO_MS, umbral_n_mas_1=UMBRAL_N_MAS_1):
+        self.umbral_lento_ms = umbral_lento_ms
+        self.umbral_n_mas_1 = umbral_n_mas_1
+        self._local = threading.local()
+        self.latencia = Histograma('alumnos_peticion_segundos', 'Latencia de cada petición por ruta',
+                                   ('endpoint', 'metodo', 'estado'))
+        self.consultas = Histograma('alumnos_peticion_consultas', 'Consultas SQL por petición',
+                                    ('endpoint',), BUCKETS_CONSULTAS)
+        self.tiempo_db = Histograma('alumnos_peticion_db_segundos', 'Tiempo en la base de datos por petición',
+                                    ('endpoint',))
+        self.n_mas_1 = Contador('alumnos_n_mas_1_total',
+                                'Peticiones que repitieron la misma consulta más veces que el umbral',
+                                ('endpoint', 'tabla'))
+        self.reportes = Histograma('alumnos_reporte_segundos', 'Tiempo en generar cada reporte', ('tipo',))
+        # Consultas fuera de una petición (reportes en segundo plano, comandos)
+        self.consultas_fuera = Contador('alumnos_consultas_sin_peticion_total',
+                                        'Consultas SQL ejecutadas fuera de una petición', ())
+
+    # Peticiones
+    def iniciar_peticion(self):
+        self._local.peticion = PeticionActual()
+
+    def terminar_peticion(self, endpoint, metodo, estado):
+        peticion = getattr(self._local, 'peticion', None)
+        if peticion is None:
+            return
+        self._local.peticion = None
+        duracion = time.perf_counter() - peticion.inicio
+        endpoint = endpoint or 'sin_ruta'
+        self.latencia.observar(duracion, endpoint, metodo, estado)
+        self.consultas.observar(peticion.consultas, endpoint)
+        self.tiempo_db.observar(peticion.tiempo_db, endpoint)
+
+        for sentencia, veces in peticion.sentencias.items():
+            if veces >= self.umbral_n_mas_1:
+                self.n_mas_1.incrementar(endpoint, _tabla(sentencia))
+                logger.warning("Posible N+1 en %s: %d ejecuciones de %s", endpoint, veces, " ".join(sentencia.split())[:200])
+
+        if self.umbral_lento_ms and duracion * 1000 >= self.umbral_lento_ms:
+            logger.warning("Petición lenta %s %s: %.0f ms, %d consultas, %.0f ms en la base de datos",
+                           metodo, endpoint, duracion * 1000, peticion.consultas, peticion.tiempo_db * 1000)
+
+    def en_peticion(self, funcion):
+        """Envuelve `funcion` para que sus consultas cuenten en la petición de quien la envuelve,
+        aunque corra en otro hilo (los reportes de descarga directa)."""
+        peticion = getattr(self._local, 'peticion', None)
+
+        def envuelta(*args):
+            anterior = getattr(self._local, 'peticion', None)
+            self._local.peticion = peticion
+            try:
+                return funcion(*args)
+            finally:
+                self._local.peticion = anterior
+        return envuelta
+
+    # SQL
+    def instrumentar_engine(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def antes(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def despues(conn, cursor, statement, parameters, context, executemany):
+            duracion = time.perf_counter() - conn.info['inicio_consulta'].pop()
+            peticion = getattr(self._local, 'peticion', None)
+            if peticion is None:
+                self.consultas_fuera.incrementar()
+                return
+            peticion.consultas += 1
+            peticion.tiempo_db += duracion
+            # Las sentencias llegan con marcadores en lugar de valores, así que un lazy load repetido
+            # (por ejemplo `alumno.pagos` dentro de un ciclo) produce el mismo texto
+            peticion.sentencias[statement] += 1
+
+    # Reportes
+    @contextmanager
+    def medir_reporte(self, tipo):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.reportes.observar(time.perf_counter() - inicio, tipo)
+
+    def exponer(self):
+        lineas = []
+        for metrica in (self.latencia, self.consultas, self.tiempo_db, self.n_mas_1,
+                        self.reportes, self.consultas_fuera):
+            lineas.extend(metrica.exponer())
+        return '\n'.join(lineas) + '\n'
+
+
+def _tabla(sentencia):
+    partes = sentencia.split()
+    for anterior, palabra in zip(partes, partes[1:]):
+        if anterior.upper() in ('FROM', 'INTO', 'UPDATE'):
+            return palabra.strip('"`')
+    return 'desconocida'
+
+
+metricas = Metricas()
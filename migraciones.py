@@ -0,0 +1,59 @@
+## Migraciones para bases de datos existentes
+from sqlalchemy import inspect, text
+
+
+def aplicar_indices(metadata, engine):
+    """Crea los índices declarados en los modelos que falten en la base de datos.
+
+    `create_all` sólo crea índices junto con tablas nuevas, así que una base
+    existente (como AlumnosTB.db) no los recibe sin este paso.
+    """
+    inspector = inspect(engine)
+    creados = []
+    for tabla in metadata.sorted_tables:
+        existentes = {i['name'] for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                indice.create(bind=engine)
+                creados.append(indice.name)
+    if creados:
+        # Estadísticas para que el planificador de SQLite elija los índices nuevos
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+    return creados
+
+
+COLUMNAS_BUSQUEDA = ['nombre', 'apaterno', 'apmaterno', 'curp', 'numafiliacion']
+
+
+def crear_busqueda_alumnos(engine):
+    """Tabla FTS5 sobre los datos de identificación del alumno, sincronizada con triggers.
+
+    El tokenizador quita acentos y mayúsculas ("Núñez" coincide con "nunez") y
+    los índices de prefijo hacen que la búsqueda mientras se escribe sea
+    inmediata.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    columnas = ', '.join(COLUMNAS_BUSQUEDA)
+    nuevas = ', '.join(f'new.{c}' for c in COLUMNAS_BUSQUEDA)
+    viejas = ', '.join(f'old.{c}' for c in COLUMNAS_BUSQUEDA)
+    with engine.begin() as conn:
+        existe = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alumnos_fts'")).first()
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS alumnos_fts USING fts5({columnas}, "
+            "content='alumnos', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS alumnos_fts_ai AFTER INSERT ON alumnos BEGIN "
+            f"INSERT INTO alumnos_fts(rowid, {columnas}) VALUES (new.id, {nuevas}); END"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS alumnos_fts_ad AFTER DELETE ON alumnos BEGIN "
+            f"INSERT INTO alumnos_fts(alumnos_fts, rowid, {columnas}) VALUES ('delete', old.id, {viejas}); END"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS alumnos_fts_au AFTER UPDATE ON alumnos BEGIN "
+            f"INSERT INTO alumnos_fts(alumnos_fts, rowid, {columnas}) VALUES ('delete', old.id, {viejas}); "
+            f"INSERT INTO alumnos_fts(rowid, {columnas}) VALUES (new.id, {nuevas}); END"))
+        if not existe:
+            conn.execute(text("INSERT INTO alumnos_fts(alumnos_fts) VALUES ('rebuild')"))
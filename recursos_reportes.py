@@ -0,0 +1,74 @@
+## Logos de los reportes: se leen y se escalan una vez por proceso
+# Cada reporte recibía el PNG original tal cual: openpyxl lo vuelve a leer de
+# disco y lo incrusta completo en el libro, y reportlab lo decodifica y lo
+# comprime de nuevo en cada PDF. Aquí se escalan al tamaño en que se dibujan y
+# se guardan en memoria; si el archivo cambia (otra mtime) se vuelven a cargar.
+import os
+import threading
+from io import BytesIO
+
+# Píxeles por punto con que se guarda cada logo: el doble para Excel (pantallas
+# de alta densidad) y el triple para PDF (~216 dpi al imprimir)
+ESCALA_EXCEL = 2
+ESCALA_PDF = 3
+
+
+def _escalar(ruta, ancho, alto, conservar_proporcion):
+    """Imagen de PIL a lo más de `ancho`×`alto` px; nunca se agranda."""
+    from PIL import Image
+    with Image.open(ruta) as original:
+        imagen = original.copy()
+    if conservar_proporcion:
+        imagen.thumbnail((ancho, alto), Image.LANCZOS)
+    else:
+        tamano = (min(ancho, imagen.width), min(alto, imagen.height))
+        if tamano != imagen.size:
+            imagen = imagen.resize(tamano, Image.LANCZOS)
+    return imagen
+
+
+class RecursosReportes:
+    def __init__(self):
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clave, ruta, cargar):
+        mtime = os.stat(ruta).st_mtime_ns
+        entrada = self._entradas.get(clave)
+        if entrada is None or entrada[0] != mtime:
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada is None or entrada[0] != mtime:
+                    entrada = (mtime, cargar())
+                    self._entradas[clave] = entrada
+        return entrada[1]
+
+    def logo_excel(self, ruta, ancho, alto):
+        """PNG del logo para mostrarse en `ancho`×`alto` px.
+
+        openpyxl estira la imagen a ese tamaño, así que no hace falta conservar
+        la proporción. Son bytes: cada libro necesita su propio Image, que se
+        arma con BytesIO(...) sin volver a disco.
+        """
+        def cargar():
+            salida = BytesIO()
+            _escalar(ruta, ancho * ESCALA_EXCEL, alto * ESCALA_EXCEL, False).save(salida, format='PNG', optimize=True)
+            return salida.getvalue()
+        return self._obtener(('excel', ruta, ancho, alto), ruta, cargar)
+
+    def logo_pdf(self, ruta, ancho, alto):
+        """ImageReader del logo para dibujarse en una caja de `ancho`×`alto` puntos.
+
+        El mismo objeto sirve para todos los PDF: reportlab sólo lee de él.
+        """
+        def cargar():
+            from reportlab.lib.utils import ImageReader
+            return ImageReader(_escalar(ruta, ancho * ESCALA_PDF, alto * ESCALA_PDF, True))
+        return self._obtener(('pdf', ruta, ancho, alto), ruta, cargar)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+recursos = RecursosReportes()
@@ -0,0 +1,304 @@
+## Motor de reportes en Excel compartido por todas las rutas de reportes
+# openpyxl y reportlab se importan en el primer reporte y no al arrancar: la
+# mayoría de las peticiones no genera reportes. Para que un worker llegue con
+# todo cargado, defina ALUMNOS_PRECARGAR_REPORTES=1 (ver precargar()).
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import chain, islice
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from recursos_reportes import recursos
+
+# Filas que se leen antes de escribir la hoja para calcular el ancho de las columnas
+MUESTRA_ANCHO = 500
+ANCHO_MAXIMO = 60
+
+# Los reportes se arman en memoria; sólo los muy grandes pasan a un archivo temporal anónimo
+MAX_REPORTE_EN_MEMORIA = 8 * 1024 * 1024
+MIME_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MIME_PDF = 'application/pdf'
+
+PRECARGAR_REPORTES = os.environ.get('ALUMNOS_PRECARGAR_REPORTES', '0') == '1'
+
+
+def precargar():
+    """Importa openpyxl y reportlab y arma los estilos antes del primer reporte.
+
+    Con `gunicorn --preload` se llama una vez en el proceso maestro y los
+    workers comparten esas páginas; sin él, cada worker las carga al iniciar.
+    """
+    estilos_encabezado_excel()
+    estilos_pdf()
+    configurar_reportlab()
+    import openpyxl.drawing.image  # noqa: F401
+    import reportlab.pdfgen.canvas  # noqa: F401
+
+
+@lru_cache(maxsize=None)
+def estilos_encabezado_excel():
+    from openpyxl.styles import Font, PatternFill, Alignment
+    return (Font(color="FFFFFF", bold=True),
+            PatternFill(start_color="000080", end_color="000080", fill_type="solid"),
+            Alignment(horizontal="center", vertical="center"))
+
+
+def buffer_reporte():
+    return SpooledTemporaryFile(max_size=MAX_REPORTE_EN_MEMORIA)
+
+
+def ancho_valor(valor):
+    """Caracteres que ocupa un valor una vez escrito en la celda."""
+    if valor is None:
+        return 0
+    if isinstance(valor, datetime):
+        return 19
+    if isinstance(valor, date):
+        return 10
+    if isinstance(valor, bool):
+        return 5
+    if isinstance(valor, float):
+        return len(f"{valor:.2f}")
+    return len(str(valor))
+
+
+class AnchoColumnas:
+    """Lleva el ancho máximo de cada columna conforme se leen las filas."""
+
+    def __init__(self, encabezados):
+        self.anchos = [len(str(h)) for h in encabezados]
+
+    def observar(self, fila):
+        anchos = self.anchos
+        for i, valor in enumerate(fila):
+            ancho = ancho_valor(valor)
+            if ancho > anchos[i]:
+                anchos[i] = ancho
+        return fila
+
+    def aplicar(self, ws, factor):
+        from openpyxl.utils import get_column_letter
+        for i, ancho in enumerate(self.anchos, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = min((ancho + 2) * factor, ANCHO_MAXIMO)
+
+
+def escribir_excel(destino, titulo, encabezados, filas, logo, fila_encabezado=6, factor_ancho=1.2):
+    """Escribe un reporte en un libro de solo escritura, fila por fila.
+
+    `filas` es cualquier iterable de tuplas (por ejemplo un query con
+    `yield_per`); nunca se carga completo en memoria. `logo` es un dict con
+    `ruta`, `ancho`, `alto`, `celda` y `merge`.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.drawing.image import Image
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo)
+
+    # Column widths must be set before the first row is written, so they are
+    # measured on the rows buffered here and never on the finished sheet
+    anchos = AnchoColumnas(encabezados)
+    filas = iter(filas)
+    muestra = [anchos.observar(fila) for fila in islice(filas, MUESTRA_ANCHO)]
+    anchos.aplicar(ws, factor_ancho)
+
+    # Add logo (ya escalado y en memoria)
+    img = Image(BytesIO(recursos.logo_excel(logo['ruta'], logo['ancho'], logo['alto'])))
+    img.width = logo['ancho']
+    img.height = logo['alto']
+    ws.add_image(img, logo['celda'])
+    ws.merged_cells.add(logo['merge'])
+
+    for _ in range(fila_encabezado - 1):
+        ws.append([])
+
+    # Write headers
+    font, fill, alignment = estilos_encabezado_excel()
+    fila = []
+    for header in encabezados:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = font
+        cell.fill = fill
+        cell.alignment = alignment
+        fila.append(cell)
+    ws.append(fila)
+
+    # Write data
+    for fila in chain(muestra, filas):
+        ws.append(tuple(fila))
+
+    wb.save(destino)
+
+
+## Reporte en pdf
+# Renglones de alto fijo: cada página lleva un número conocido de filas y la
+# tabla de cada página se arma y se dibuja sin que reportlab tenga que partirla
+ALTO_FILA_PDF = 16
+MARGEN_PDF = 36
+ALTO_ENCABEZADO_PAGINA = 70
+ALTO_PIE_PAGINA = 24
+FUENTE_PDF = 'Helvetica'
+FUENTE_PDF_NEGRITA = 'Helvetica-Bold'
+TAMANO_FUENTE_PDF = 9
+# Un texto que no cabe se escribe más chico, nunca recortado. Debajo de este tamaño se parte en
+# dos renglones, que caben en el alto fijo de la fila; si ni así cabe, queda en uno más chico
+TAMANO_FUENTE_MINIMO_PDF = 5
+RELLENO_CELDA_PDF = 6  # LEFTPADDING y RIGHTPADDING por omisión de Table
+
+
+@lru_cache(maxsize=None)
+def estilos_pdf():
+    """Estilos de tabla y de la fila de totales, compartidos por todas las páginas y reportes."""
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    tabla = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.blue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), FUENTE_PDF_NEGRITA),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), FUENTE_PDF),
+        ('FONTSIZE', (0, 0), (-1, -1), TAMANO_FUENTE_PDF),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ])
+    totales = TableStyle([
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), FUENTE_PDF_NEGRITA),
+    ])
+    return tabla, totales
+
+
+@lru_cache(maxsize=None)
+def configurar_reportlab():
+    # Imágenes en binario y no en ASCII85: sin la extensión en C de reportlab esa
+    # codificación corre en Python puro y se llevaba casi todo el tiempo de un PDF chico
+    from reportlab import rl_config
+    rl_config.useA85 = 0
+
+
+def _texto_celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, float):
+        return f"{valor:,.2f}"
+    return str(valor)
+
+
+def _ajustar_celdas(datos, anchos, negritas):
+    """Comandos de TableStyle para las celdas cuyo texto no cabe a TAMANO_FUENTE_PDF.
+
+    `negritas` son los índices de las filas en negrita. Casi todas las celdas
+    caben sin medirlas: ningún carácter de Helvetica es más ancho que el tamaño
+    de la letra.
+    """
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    comandos = []
+    disponibles = [a - 2 * RELLENO_CELDA_PDF for a in anchos]
+    for r, fila in enumerate(datos):
+        fuente = FUENTE_PDF_NEGRITA if r in negritas else FUENTE_PDF
+        for c, texto in enumerate(fila):
+            disponible = disponibles[c]
+            if len(texto) * TAMANO_FUENTE_PDF <= disponible:
+                continue
+            ancho = stringWidth(texto, fuente, TAMANO_FUENTE_PDF)
+            if ancho <= disponible:
+                continue
+            tamano = TAMANO_FUENTE_PDF * disponible / ancho
+            if tamano < TAMANO_FUENTE_MINIMO_PDF:
+                # Dos renglones si caben; si no (o una palabra no se puede partir), un solo renglón aún más chico
+                renglones = simpleSplit(texto, fuente, TAMANO_FUENTE_MINIMO_PDF, disponible)
+                if len(renglones) <= 2 and all(
+                        stringWidth(renglon, fuente, TAMANO_FUENTE_MINIMO_PDF) <= disponible for renglon in renglones):
+                    fila[c] = '\n'.join(renglones)
+                    tamano = TAMANO_FUENTE_MINIMO_PDF
+            comandos += [('FONTSIZE', (c, r), (c, r), tamano), ('LEADING', (c, r), (c, r), tamano * 1.2)]
+    return comandos
+
+
+def escribir_pdf(buffer, encabezados, filas, titulo='', logo='static/img/logo.png',
+                 pesos=None, columnas_suma=(), horizontal=False):
+    """Escribe un reporte PDF página por página.
+
+    `filas` se consume conforme se llenan las páginas (un query con
+    `yield_per` se lee por bloques), así que nunca se arma la tabla
+    completa. `pesos` reparte el ancho entre columnas; las columnas en
+    `columnas_suma` se totalizan en una fila al final. Los valores no se
+    recortan: el que no cabe en su columna se escribe con letra más chica.
+    """
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+
+    configurar_reportlab()
+    estilo_tabla, estilo_totales = estilos_pdf()
+    tamano = landscape(letter) if horizontal else letter
+    ancho_pagina, alto_pagina = tamano
+    ancho_util = ancho_pagina - 2 * MARGEN_PDF
+    pesos = pesos or [1] * len(encabezados)
+    anchos = [ancho_util * p / sum(pesos) for p in pesos]
+    filas_por_pagina = int((alto_pagina - 2 * MARGEN_PDF - ALTO_ENCABEZADO_PAGINA - ALTO_PIE_PAGINA)
+                           // ALTO_FILA_PDF) - 1
+    generado = datetime.now().strftime('%Y-%m-%d %H:%M')
+    totales = {i: 0 for i in columnas_suma}
+
+    c = canvas.Canvas(buffer, pagesize=tamano)
+    c.setTitle(titulo)
+
+    ancho_logo, alto_logo = 100, 50
+    imagen_logo = recursos.logo_pdf(logo, ancho_logo, alto_logo)
+
+    def encabezado_pagina(numero):
+        c.drawImage(imagen_logo, MARGEN_PDF, alto_pagina - MARGEN_PDF - alto_logo,
+                    width=ancho_logo, height=alto_logo, preserveAspectRatio=True, mask='auto')
+        c.setFont(FUENTE_PDF_NEGRITA, 14)
+        c.drawString(MARGEN_PDF + 115, alto_pagina - MARGEN_PDF - 30, titulo)
+        c.setFont(FUENTE_PDF, 8)
+        c.drawRightString(ancho_pagina - MARGEN_PDF, alto_pagina - MARGEN_PDF - 30, f"Generado: {generado}")
+        c.drawCentredString(ancho_pagina / 2, MARGEN_PDF, f"Página {numero}")
+
+    def dibujar(datos, con_totales=False):
+        # Antes de armar la tabla: Table copia los textos y _ajustar_celdas puede partirlos
+        ajustes = _ajustar_celdas(datos, anchos, {0, len(datos) - 1} if con_totales else {0})
+        table = Table(datos, colWidths=anchos, rowHeights=ALTO_FILA_PDF)
+        table.setStyle(estilo_tabla)
+        if con_totales:
+            table.setStyle(estilo_totales)
+        if ajustes:
+            table.setStyle(TableStyle(ajustes))
+        _, alto = table.wrapOn(c, ancho_util, alto_pagina)
+        table.drawOn(c, MARGEN_PDF, alto_pagina - MARGEN_PDF - ALTO_ENCABEZADO_PAGINA - alto)
+
+    filas = iter(filas)
+    pagina = 0
+    while True:
+        bloque = list(islice(filas, filas_por_pagina))
+        ultima = len(bloque) < filas_por_pagina
+        if not bloque and pagina > 0 and not totales:
+            break
+        datos = [list(encabezados)]
+        for fila in bloque:
+            for i in totales:
+                totales[i] += fila[i] or 0
+            datos.append([_texto_celda(v) for v in fila])
+        con_totales = bool(totales) and ultima
+        if con_totales:
+            datos.append(['Total' if i == 0 else (_texto_celda(totales[i]) if i in totales else '')
+                          for i in range(len(encabezados))])
+        pagina += 1
+        encabezado_pagina(pagina)
+        dibujar(datos, con_totales)
+        c.showPage()
+        if ultima:
+            break
+
+    c.save()
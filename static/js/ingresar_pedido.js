@@ -9,6 +9,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const notificacion = document.getElementById('notificacion');
     let pedidoIdAEliminar = null;
 
+    // Sincronización de los pedidos de hoy: sólo se piden los cambios desde la última versión
+    const INTERVALO_SINCRONIZACION = 10000;
+    const filasPedidos = new Map();
+    let versionPedidos = null;
+    let fechaPedidos = null;
+    let sincronizando = false;
+    let sincronizacionPendiente = false;
+
     const productosOptions = {
         espinillera: {
             tallas: ['CH', 'MD', 'LG'],
@@ -163,7 +171,7 @@ document.addEventListener('DOMContentLoaded', function() {
             productos: productos
         };
 
-        fetch('/ingresar_pedido', {
+        fetch('/captura_pedido', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -176,7 +184,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 mostrarNotificacion(data.message, 'success');
                 form.reset();
                 document.querySelectorAll('.producto-form').forEach(form => form.remove());
-                cargarPedidosHoy();
+                sincronizarPedidosHoy();
             } else {
                 mostrarNotificacion(data.message, 'error');
             }
@@ -187,28 +195,73 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    function cargarPedidosHoy() {
-        fetch('/pedidos_hoy')
+    function filaPedido(pedido) {
+        // Las celdas se llenan con textContent: los nombres vienen tal como se capturaron
+        const tr = document.createElement('tr');
+        [pedido.nombre_solicitante, pedido.tipo_producto, pedido.talla, pedido.color || 'N/A',
+         pedido.cantidad].forEach(valor => {
+            tr.insertCell().textContent = valor;
+        });
+        const boton = document.createElement('button');
+        boton.className = 'eliminar-pedido';
+        boton.dataset.id = pedido.id;
+        boton.textContent = 'Eliminar';
+        tr.insertCell().appendChild(boton);
+        return tr;
+    }
+
+    function sincronizarPedidosHoy() {
+        if (sincronizando) {
+            // Se repite al terminar la que está en curso para no perder un cambio propio
+            sincronizacionPendiente = true;
+            return;
+        }
+        sincronizando = true;
+        const url = versionPedidos === null ? '/pedidos_hoy' : `/pedidos_hoy?desde=${versionPedidos}`;
+        fetch(url)
             .then(response => response.json())
-            .then(pedidos => {
+            .then(data => {
                 const tbody = tablaPedidosHoy.querySelector('tbody');
-                tbody.innerHTML = '';
-                pedidos.forEach(pedido => {
-                    const tr = document.createElement('tr');
-                    tr.innerHTML = `
-                        <td>${pedido.nombre_solicitante}</td>
-                        <td>${pedido.tipo_producto}</td>
-                        <td>${pedido.talla}</td>
-                        <td>${pedido.color || 'N/A'}</td>
-                        <td>${pedido.cantidad}</td>
-                        <td><button class="eliminar-pedido" data-id="${pedido.id}">Eliminar</button></td>
-                    `;
-                    tbody.appendChild(tr);
+                if (versionPedidos !== null && data.fecha !== fechaPedidos) {
+                    // Cambió el día: se recarga la tabla completa
+                    versionPedidos = null;
+                    sincronizacionPendiente = true;
+                    return;
+                }
+                if (versionPedidos === null) {
+                    tbody.innerHTML = '';
+                    filasPedidos.clear();
+                }
+                data.eliminados.forEach(id => {
+                    const tr = filasPedidos.get(id);
+                    if (tr) {
+                        tr.remove();
+                        filasPedidos.delete(id);
+                    }
+                });
+                data.pedidos.forEach(pedido => {
+                    const tr = filaPedido(pedido);
+                    const anterior = filasPedidos.get(pedido.id);
+                    if (anterior) {
+                        anterior.replaceWith(tr);
+                    } else {
+                        tbody.appendChild(tr);
+                    }
+                    filasPedidos.set(pedido.id, tr);
                 });
+                versionPedidos = data.version;
+                fechaPedidos = data.fecha;
             })
             .catch(error => {
                 console.error('Error:', error);
                 mostrarNotificacion('Ocurrió un error al cargar los pedidos de hoy.', 'error');
+            })
+            .finally(() => {
+                sincronizando = false;
+                if (sincronizacionPendiente) {
+                    sincronizacionPendiente = false;
+                    sincronizarPedidosHoy();
+                }
             });
     }
 
@@ -238,7 +291,7 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             if (data.success) {
                 mostrarNotificacion(data.message, 'success');
-                cargarPedidosHoy();
+                sincronizarPedidosHoy();
             } else {
                 mostrarNotificacion(data.message, 'error');
             }
@@ -260,6 +313,11 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 3000);
     }
 
-    // Cargar pedidos de hoy al iniciar la página
-    cargarPedidosHoy();
+    // Cargar pedidos de hoy al iniciar la página y seguir los cambios de otras capturas
+    sincronizarPedidosHoy();
+    setInterval(() => {
+        if (!document.hidden) {
+            sincronizarPedidosHoy();
+        }
+    }, INTERVALO_SINCRONIZACION);
 });
\ No newline at end of file
@@ -4,7 +4,53 @@ document.addEventListener('DOMContentLoaded', function() {
     const confirmarBtn = document.getElementById('confirmar-eliminar');
     const cancelarBtn = document.getElementById('cancelar-eliminar');
     const notificacion = document.getElementById('notificacion');
+    const finPedidos = document.getElementById('fin-pedidos');
     let pedidoIdAEliminar = null;
+    let siguiente = finPedidos.dataset.siguiente;
+    let cargando = false;
+
+    // Carga la siguiente página del historial cuando se llega al final de la tabla
+    const observador = new IntersectionObserver(entries => {
+        if (entries[0].isIntersecting) {
+            cargarMasPedidos();
+        }
+    });
+    observador.observe(finPedidos);
+
+    function cargarMasPedidos() {
+        if (!siguiente || cargando) {
+            return;
+        }
+        cargando = true;
+        fetch(`/api/pedidos?despues=${encodeURIComponent(siguiente)}`)
+            .then(response => response.json())
+            .then(data => {
+                const tbody = tablaPedidos.querySelector('tbody');
+                data.pedidos.forEach(pedido => tbody.appendChild(filaPedido(pedido)));
+                siguiente = data.siguiente;
+                cargando = false;
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                cargando = false;
+                mostrarNotificacion('Ocurrió un error al cargar más pedidos.', 'error');
+            });
+    }
+
+    function filaPedido(pedido) {
+        // Las celdas se llenan con textContent: los nombres vienen tal como se capturaron
+        const tr = document.createElement('tr');
+        [pedido.fecha, pedido.nombre_solicitante, pedido.tipo_producto, pedido.talla,
+         pedido.color || 'N/A', pedido.cantidad].forEach(valor => {
+            tr.insertCell().textContent = valor;
+        });
+        const boton = document.createElement('button');
+        boton.className = 'eliminar-pedido';
+        boton.dataset.id = pedido.id;
+        boton.textContent = 'Eliminar';
+        tr.insertCell().appendChild(boton);
+        return tr;
+    }
 
     tablaPedidos.addEventListener('click', function(e) {
         if (e.target.classList.contains('eliminar-pedido')) {
@@ -47,6 +93,51 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Los reportes históricos se generan en segundo plano y se descargan al terminar
+    document.querySelectorAll('a[data-reporte]').forEach(enlace => {
+        enlace.addEventListener('click', function(e) {
+            e.preventDefault();
+            mostrarNotificacion('Generando reporte...', 'success');
+            fetch('/reportes', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ tipo: enlace.dataset.reporte })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    esperarReporte(data.estado_url);
+                } else {
+                    mostrarNotificacion(data.message, 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                window.location = enlace.href;
+            });
+        });
+    });
+
+    function esperarReporte(estadoUrl) {
+        fetch(estadoUrl)
+            .then(response => response.json())
+            .then(data => {
+                if (data.estado === 'listo') {
+                    window.location = data.descarga_url;
+                } else if (data.estado === 'error' || data.success === false) {
+                    mostrarNotificacion(data.error || data.message, 'error');
+                } else {
+                    setTimeout(() => esperarReporte(estadoUrl), 1000);
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                mostrarNotificacion('Ocurrió un error al generar el reporte.', 'error');
+            });
+    }
+
     function mostrarNotificacion(mensaje, tipo) {
         notificacion.textContent = mensaje;
         notificacion.className = `notificacion ${tipo}`;
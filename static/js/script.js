@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const editarForm = document.getElementById('editar-form');
     const pagoForm = document.getElementById('pago-form');
     const eliminarBotones = document.querySelectorAll('.eliminar-alumno');
+    const finAlumnos = document.getElementById('fin-alumnos');
     
 
     if (registroForm) {
@@ -104,4 +105,110 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
     }
+
+    if (finAlumnos) {
+        // Carga la siguiente página de alumnos cuando se llega al final de la tabla
+        const tbody = document.querySelector('#tabla-alumnos tbody');
+        const buscarAlumno = document.getElementById('buscar-alumno');
+        // Filas de la lista mientras se muestran resultados de búsqueda; `siguiente`
+        // sigue siendo el cursor de estas filas, así que al volver se continúa donde iban
+        const lista = document.createDocumentFragment();
+        let siguiente = finAlumnos.dataset.siguiente;
+        const corte = finAlumnos.dataset.corte;
+        const rango = new URLSearchParams();
+        if (finAlumnos.dataset.desde) rango.set('desde', finAlumnos.dataset.desde);
+        if (finAlumnos.dataset.hasta) rango.set('hasta', finAlumnos.dataset.hasta);
+        let cargando = false;
+        let buscando = false;
+        let temporizador = null;
+
+        function enlace(href, texto) {
+            const a = document.createElement('a');
+            a.href = href;
+            a.textContent = texto;
+            return a;
+        }
+
+        function filaAlumno(alumno) {
+            // Los resultados de la búsqueda no traen pagos: esas celdas quedan vacías.
+            // Todo va por textContent, igual que el escape de la plantilla
+            const conPagos = alumno.num_pagos !== undefined;
+            const alCorriente = alumno.ultimo_pago && alumno.ultimo_pago >= corte;
+            const tr = document.createElement('tr');
+            [`${alumno.nombre} ${alumno.apaterno} ${alumno.apmaterno}`, alumno.numafiliacion || '',
+             alumno.telefono, alumno.estatus].forEach(valor => {
+                tr.insertCell().textContent = valor;
+            });
+            const ultimoPago = tr.insertCell();
+            const pagos = tr.insertCell();
+            if (conPagos) {
+                ultimoPago.className = alCorriente ? 'al-corriente' : 'atrasado';
+                ultimoPago.textContent = alumno.ultimo_pago || 'Sin pagos';
+                pagos.appendChild(enlace(`/consulta_de_pagos/${encodeURIComponent(alumno.id)}`,
+                                         `${alumno.total_pagado} (${alumno.num_pagos})`));
+            }
+            tr.insertCell().appendChild(
+                enlace(alumno.url || `/actualizar_alumno/${encodeURIComponent(alumno.id)}`, 'Actualizar Datos'));
+            return tr;
+        }
+
+        // /api/estado_pagos manda cada alumno como lista en el orden de `columnas`
+        function alumnosDeEstado(data) {
+            return data.alumnos.map(fila => Object.fromEntries(data.columnas.map((columna, i) => [columna, fila[i]])));
+        }
+
+        const observador = new IntersectionObserver(entries => {
+            if (!entries[0].isIntersecting || !siguiente || cargando || buscando) {
+                return;
+            }
+            cargando = true;
+            const parametros = new URLSearchParams(rango);
+            parametros.set('despues', siguiente);
+            fetch(`/api/estado_pagos?${parametros}`)
+                .then(response => response.json())
+                .then(data => {
+                    const destino = buscando ? lista : tbody;
+                    alumnosDeEstado(data).forEach(alumno => destino.appendChild(filaAlumno(alumno)));
+                    siguiente = data.siguiente;
+                    cargando = false;
+                })
+                .catch(error => {
+                    console.error('Error:', error);
+                    cargando = false;
+                });
+        });
+        observador.observe(finAlumnos);
+
+        // Búsqueda mientras se escribe por nombre, apellidos, CURP o número de afiliación
+        if (buscarAlumno) {
+            buscarAlumno.addEventListener('input', function() {
+                clearTimeout(temporizador);
+                const texto = buscarAlumno.value.trim();
+                if (!texto) {
+                    if (buscando) {
+                        buscando = false;
+                        tbody.replaceChildren(lista);
+                    }
+                    return;
+                }
+                temporizador = setTimeout(() => {
+                    fetch(`/api/buscar_alumnos?q=${encodeURIComponent(texto)}`)
+                        .then(response => response.json())
+                        .then(data => {
+                            if (buscarAlumno.value.trim() !== texto) {
+                                return;
+                            }
+                            if (!buscando) {
+                                buscando = true;
+                                lista.append(...tbody.childNodes);
+                            }
+                            tbody.replaceChildren(...data.alumnos.map(filaAlumno));
+                        })
+                        .catch(error => {
+                            console.error('Error:', error);
+                        });
+                }, 150);
+            });
+        }
+    }
 });  
\ No newline at end of file
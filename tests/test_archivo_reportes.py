@@ -0,0 +1,84 @@
+## Archivo de reportes de pedidos: el archivado se regenera con cada cambio del día
+import io
+import os
+import tempfile
+
+import pytest
+
+TMP = tempfile.mkdtemp()
+# La base y el archivo se eligen por variable de entorno antes de importar la aplicación
+os.environ['ALUMNOS_DB_URL'] = f"sqlite:///{os.path.join(TMP, 'AlumnosTB.db')}"
+os.environ['ALUMNOS_ARCHIVO_REPORTES'] = os.path.join(TMP, 'archivo_reportes')
+
+from openpyxl import load_workbook  # noqa: E402
+
+from app import CONSTRUCTORES_ARCHIVO, app  # noqa: E402
+from archivo_reportes import archivo  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def capturar(client, talla, cantidad=2):
+    respuesta = client.post('/captura_pedido', json={
+        'nombre_solicitante': 'Solicitante', 'productos': [{'tipo': 'dobok', 'talla': talla, 'cantidad': cantidad}]})
+    assert respuesta.get_json()['success']
+
+
+def tallas(respuesta):
+    hoja = load_workbook(io.BytesIO(respuesta.get_data()), read_only=True).active
+    return {fila[3] for fila in hoja.iter_rows(values_only=True) if fila and fila[2] == 'dobok'}
+
+
+def test_borrar_y_recapturar_el_ultimo_pedido_regenera_el_archivo(client):
+    capturar(client, 'M')
+    capturar(client, 'L')
+    antes = client.get('/reporte_pedidos_dia')
+    assert antes.status_code == 200
+    assert tallas(antes) == {'M', 'L'}
+
+    # SQLite reutiliza el id del último pedido borrado; conteo y suma quedan iguales
+    ultimo = max(p['id'] for p in client.get('/pedidos_hoy').get_json()['pedidos'])
+    assert client.delete(f'/eliminar_pedido/{ultimo}').get_json()['success']
+    capturar(client, 'XL')
+
+    despues = client.get('/reporte_pedidos_dia')
+    assert despues.headers['ETag'] != antes.headers['ETag']
+    assert tallas(despues) == {'M', 'XL'}
+    assert tallas(client.get('/generar_reporte_pedidos_hoy_excel')) == {'M', 'XL'}
+
+
+def test_fecha_sin_pedidos_no_se_archiva(client):
+    respuesta = client.get('/reporte_pedidos_dia?fecha=0001-01-01')
+    assert respuesta.status_code == 404
+    assert not os.path.exists(os.path.join(os.environ['ALUMNOS_ARCHIVO_REPORTES'], '1'))
+
+
+def test_pedido_capturado_mientras_se_archiva(client, monkeypatch):
+    capturar(client, 'S')
+    construir_pdf = CONSTRUCTORES_ARCHIVO['pdf']
+
+    def construir_con_captura(session, archivo, fecha):
+        # Un pedido que llega mientras se arma el archivo deja vieja la firma recién guardada
+        capturar(app.test_client(), 'XS')
+        construir_pdf(session, archivo, fecha)
+
+    monkeypatch.setitem(CONSTRUCTORES_ARCHIVO, 'pdf', construir_con_captura)
+    respuesta = client.get('/reporte_pedidos_dia')
+    assert respuesta.status_code == 200
+    assert 'S' in tallas(respuesta)
+
+
+def test_sin_archivo_se_arma_al_momento(client, monkeypatch):
+    capturar(client, 'XXL')
+
+    def sin_espacio(carpeta, destino, escribir):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(archivo, 'directorio', os.path.join(TMP, 'otro_archivo'))
+    monkeypatch.setattr(archivo, '_escribir', sin_espacio)
+    respuesta = client.get('/reporte_pedidos_dia')
+    assert respuesta.status_code == 200
+    assert 'XXL' in tallas(respuesta)
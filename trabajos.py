@@ -0,0 +1,112 @@
+## Cola local de trabajos en segundo plano (reportes grandes)
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Reportes que se generan al mismo tiempo; el resto espera en la cola
+MAX_TRABAJOS_CONCURRENTES = 2
+# Trabajos pendientes o en proceso antes de rechazar nuevos
+MAX_TRABAJOS_EN_COLA = 20
+# Segundos que se conserva un resultado después de terminar
+VIGENCIA_RESULTADO = 30 * 60
+# Reportes de descarga directa que se arman a la vez; la petición espera el suyo
+MAX_REPORTES_SINCRONOS = 4
+# Nice que se suma a los hilos que arman reportes: con el servidor ocupado el sistema operativo
+# atiende primero a las peticiones (captura de pedidos) y los reportes usan el CPU que sobra
+PRIORIDAD_REPORTES = int(os.environ.get('ALUMNOS_PRIORIDAD_REPORTES', '10'))
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+LISTO = 'listo'
+ERROR = 'error'
+
+
+class ColaLlena(Exception):
+    pass
+
+
+def bajar_prioridad(incremento=PRIORIDAD_REPORTES):
+    """Baja la prioridad del hilo actual; sólo en Linux, donde cada hilo tiene su propio nice.
+
+    Sin privilegios no se puede volver a subir, así que sólo se llama en hilos
+    dedicados a reportes.
+    """
+    if not incremento or not sys.platform.startswith('linux'):
+        return
+    hilo = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, hilo, min(19, os.getpriority(os.PRIO_PROCESS, hilo) + incremento))
+    except OSError:
+        pass
+
+
+class Trabajo:
+    def __init__(self, tipo):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.estado = PENDIENTE
+        self.resultado = None
+        self.error = None
+        self.terminado = None
+
+    def a_dict(self):
+        return {"id": self.id, "tipo": self.tipo, "estado": self.estado, "error": self.error}
+
+
+class ColaTrabajos:
+    def __init__(self, max_concurrentes=MAX_TRABAJOS_CONCURRENTES, max_en_cola=MAX_TRABAJOS_EN_COLA):
+        self.max_en_cola = max_en_cola
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrentes, thread_name_prefix='reportes',
+                                            initializer=bajar_prioridad)
+        self._sincronos = ThreadPoolExecutor(max_workers=MAX_REPORTES_SINCRONOS, thread_name_prefix='reportes-directos',
+                                             initializer=bajar_prioridad)
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, tipo, funcion, *args):
+        """Agrega un trabajo; `funcion(*args)` debe regresar el resultado a entregar."""
+        with self._lock:
+            self._purgar()
+            activos = sum(1 for t in self._trabajos.values() if t.estado in (PENDIENTE, EN_PROCESO))
+            if activos >= self.max_en_cola:
+                raise ColaLlena("Demasiados reportes en proceso, intente más tarde")
+            trabajo = Trabajo(tipo)
+            self._trabajos[trabajo.id] = trabajo
+        self._executor.submit(self._ejecutar, trabajo, funcion, args)
+        return trabajo
+
+    def ejecutar(self, funcion, *args):
+        """Corre `funcion(*args)` en un hilo de reportes y espera su resultado.
+
+        Para los reportes que se descargan en la misma petición: el hilo del
+        servidor queda libre del GIL mientras espera y el trabajo pesado corre
+        con la prioridad baja de los hilos de reportes.
+        """
+        return self._sincronos.submit(funcion, *args).result()
+
+    def obtener(self, trabajo_id):
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+    def _ejecutar(self, trabajo, funcion, args):
+        trabajo.estado = EN_PROCESO
+        try:
+            trabajo.resultado = funcion(*args)
+            trabajo.estado = LISTO
+        except Exception as e:
+            trabajo.error = str(e)
+            trabajo.estado = ERROR
+        finally:
+            trabajo.terminado = time.monotonic()
+
+    def _purgar(self):
+        limite = time.monotonic() - VIGENCIA_RESULTADO
+        vencidos = [t.id for t in self._trabajos.values() if t.terminado is not None and t.terminado < limite]
+        for trabajo_id in vencidos:
+            del self._trabajos[trabajo_id]
+
+
+cola = ColaTrabajos()